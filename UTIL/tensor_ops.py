@@ -20,7 +20,8 @@ class ConfigCache(object):
 
     def read_cfg(self):
         from siri.global_config import GlobalConfig
-        self.device_ = GlobalConfig.device
+        from siri.utils.device import device_policy
+        self.device_ = str(device_policy.device)
         self.use_float64_ = not GlobalConfig.half
         self.init = True
 
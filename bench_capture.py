@@ -0,0 +1,46 @@
+import json
+import argparse
+from siri.global_config import GlobalConfig as cfg
+from siri.vision.capture import CAPTURE_BACKENDS, make_capture_backend, bench_capture
+from siri.vision.geometry import WindowGeometryTracker, geometry_to_monitor
+from siri.utils.logger import lprint
+
+
+def get_monitor():
+    tracker = WindowGeometryTracker()
+    geometry = tracker.geometry()
+    tracker.stop()
+    if geometry is None:
+        lprint('bench_capture', "scrcpy window not found, grabbing the top-left corner of the screen")
+        geometry = (0, 0) + tuple(cfg.sz_wh)
+    return geometry_to_monitor(geometry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="capture backend benchmark at cfg.sz_wh")
+    parser.add_argument('--backends', nargs='+', default=['mss', 'xdamage'], choices=list(CAPTURE_BACKENDS))
+    parser.add_argument('--n-frames', type=int, default=300)
+    parser.add_argument('--replay-source', default=None, help="video file or frame directory for the replay backend")
+    parser.add_argument('--json', default=None, help="also dump the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.backends:
+        kwargs = {'source': args.replay_source} if name == 'replay' else {}
+        try:
+            backend = make_capture_backend(name, **kwargs)
+            monitor = get_monitor() if backend.geometry() is None else geometry_to_monitor(backend.geometry())
+            res = bench_capture(backend, monitor, n_frames=args.n_frames)
+        except Exception as e:
+            lprint('bench_capture', f"{name} skipped: {e!r}")
+            continue
+        results.append(res)
+        print(f"{res['backend']:>8}: {res['fps']:8.1f} fps  p50 {res['p50_ms']:6.2f}ms  p99 {res['p99_ms']:6.2f}ms  cpu {res['cpu_percent']:5.1f}%")
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import numpy as np
+import multiprocessing as mp
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+from siri.utils.timing import TimingHistogram
+
+BACKENDS = ('torch', 'torchscript', 'onnxruntime', 'openvino')
+
+
+def load_frames(source, n):
+    from siri.vision.capture import ReplayCapture
+    shape = tuple(reversed(cfg.sz_wh)) + (3,)
+    if source is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(n)]
+    backend = ReplayCapture(source, loop=True)
+    with backend:
+        return [backend.grab(None, out=np.empty(shape, dtype=np.uint8)) for _ in range(n)]
+
+
+def peak_rss_mb():
+    # linux reports ru_maxrss in KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_runner(name, backend, batch, threads, weights):
+    """run(x: torch.Tensor) for one depth model on one backend"""
+    from siri.vision.midas import depth_zoo
+    from siri.vision.onnx_engine import ONNX_RUNTIMES, default_num_threads
+    if backend == 'torch':
+        return depth_zoo.get(name, 'eager', weights).model
+    if backend == 'torchscript':
+        return depth_zoo.get(name, 'traced', weights).model
+    path = depth_zoo.export_onnx(name, batch=batch, weights=weights)
+    session = ONNX_RUNTIMES[backend](path, threads or default_num_threads())
+    return lambda x: session(x.numpy())
+
+
+def bench_one(name, backend, batch, threads, weights, source, n_iters, warmup):
+    """one (model, backend, batch) combination, run in a fresh process so peak memory is its own"""
+    import torch
+    from siri.utils.device import use_device
+    from siri.vision.midas import DEPTH_MODELS, BatchDepthTransform
+    use_device('cpu')
+    if threads:
+        torch.set_num_threads(threads)
+    frames = load_frames(source, batch)
+    rss0 = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    run = load_runner(name, backend, batch, threads, weights)
+    load_s = time.perf_counter() - t0
+
+    _, model_sz, mean, std = DEPTH_MODELS[name]
+    transform = BatchDepthTransform(model_sz, mean, std)
+    pre = TimingHistogram('preprocess', capacity=n_iters)
+    hist = TimingHistogram('inference', capacity=n_iters)
+    with torch.inference_mode():
+        for _ in range(warmup):
+            run(transform(frames))
+        t_start = time.perf_counter()
+        for _ in range(n_iters):
+            t0 = time.perf_counter()
+            x = transform(frames)
+            t1 = time.perf_counter()
+            run(x)
+            t2 = time.perf_counter()
+            pre.record(t1 - t0)
+            hist.record(t2 - t1)
+        wall = time.perf_counter() - t_start
+    s = hist.summary()
+    return {
+        'model': name, 'backend': backend, 'batch': batch, 'threads': torch.get_num_threads() if backend in ('torch', 'torchscript') else threads,
+        'model_sz': list(model_sz), 'load_s': load_s,
+        'p50_ms': s['p50_ms'], 'p99_ms': s['p99_ms'], 'mean_ms': s['mean_ms'],
+        'preprocess_p50_ms': pre.summary()['p50_ms'],
+        'fps': batch * n_iters / wall,
+        'peak_rss_mb': peak_rss_mb(), 'model_rss_mb': peak_rss_mb() - rss0,
+    }
+
+
+def _child(queue, args):
+    try:
+        queue.put(bench_one(*args))
+    except Exception as e:
+        queue.put(e)
+
+
+def bench_isolated(*args):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    p = ctx.Process(target=_child, args=(queue, args))
+    p.start()
+    res = queue.get()
+    p.join()
+    if isinstance(res, Exception):
+        raise res
+    return res
+
+
+def main():
+    from siri.vision.midas import DEPTH_MODELS
+    parser = argparse.ArgumentParser(description="depth model latency, throughput and peak memory on cpu, eager vs torchscript vs onnx runtimes")
+    parser.add_argument('--models', nargs='+', default=list(DEPTH_MODELS))
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--threads', type=int, default=None, help="cpu threads, every available core when omitted")
+    parser.add_argument('--weights-dir', default='.', help="where the midas checkpoints are")
+    parser.add_argument('--source', default=None, help="video file or frame directory, random frames when omitted")
+    parser.add_argument('--n-iters', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--no-isolate', action='store_true', help="run everything in this process, peak memory is then cumulative")
+    parser.add_argument('--json', default=None, help="write the results here instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.models:
+        weights = os.path.join(args.weights_dir, os.path.basename(DEPTH_MODELS[name][0].__defaults__[0]))
+        if not os.path.exists(weights):
+            lprint('bench_depth', f"{name} skipped: no weights at {weights}")
+            continue
+        for backend in args.backends:
+            for batch in args.batch_sizes:
+                job = (name, backend, batch, args.threads, weights, args.source, args.n_iters, args.warmup)
+                try:
+                    res = bench_one(*job) if args.no_isolate else bench_isolated(*job)
+                except Exception as e:
+                    lprint('bench_depth', f"{name} {backend} b{batch} skipped: {e!r}")
+                    continue
+                results.append(res)
+                lprint('bench_depth', f"{name:>16} {backend:>12} b{batch}: {res['fps']:6.1f} fps  p50 {res['p50_ms']:8.2f}ms  "
+                                      f"p99 {res['p99_ms']:8.2f}ms  load {res['load_s']:5.2f}s  peak {res['peak_rss_mb']:7.1f}MB")
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
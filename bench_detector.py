@@ -0,0 +1,78 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from ultralytics import YOLO
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+from siri.utils.timing import TimingHistogram
+from siri.vision.capture import ReplayCapture
+from siri.vision.engine import make_inference_engine
+from siri.utils.device import use_device
+
+
+def load_frames(source, n):
+    shape = tuple(reversed(cfg.sz_wh)) + (3,)
+    if source is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(n)]
+    backend = ReplayCapture(source, loop=True)
+    with backend:
+        return [backend.grab(None, out=np.empty(shape, dtype=np.uint8)) for _ in range(n)]
+
+
+def bench_engine(engine, frames, n_frames, warmup):
+    hist = TimingHistogram('predict', capacity=n_frames)
+    for i in range(warmup):
+        engine.predict(frames[i % len(frames)])
+    t_start = time.perf_counter()
+    for i in range(n_frames):
+        t0 = time.perf_counter()
+        engine.predict(frames[i % len(frames)])
+        hist.record(time.perf_counter() - t0)
+    wall = time.perf_counter() - t_start
+    s = hist.summary()
+    return {'fps': n_frames / wall, 'p50_ms': s['p50_ms'], 'p99_ms': s['p99_ms'], 'mean_ms': s['mean_ms']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO detector latency at cfg.sz_wh, pytorch vs onnxruntime / openvino on cpu")
+    parser.add_argument('--model', default=f"{cfg.root_dir}/model/ScrGrabber-tick1-sunone-compat/best.pt")
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnxruntime', 'openvino'])
+    parser.add_argument('--threads', nargs='+', type=int, default=[None], help="thread counts to sweep for the onnx runtimes")
+    parser.add_argument('--device', default='cpu', help="device of the torch backend")
+    parser.add_argument('--source', default=None, help="video file or frame directory, random frames when omitted")
+    parser.add_argument('--n-frames', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--json', default=None, help="write the results here instead of stdout")
+    args = parser.parse_args()
+
+    use_device(args.device)
+    frames = load_frames(args.source, min(args.n_frames, 32))
+
+    results = []
+    for backend in args.backends:
+        for threads in (args.threads if backend != 'torch' else [None]):
+            kwargs = {} if backend == 'torch' else {'num_threads': threads}
+            try:
+                engine = make_inference_engine(YOLO(args.model, task='detect'), backend=backend, **kwargs)
+                res = bench_engine(engine, frames, args.n_frames, args.warmup)
+            except Exception as e:
+                lprint('bench_detector', f"{backend} skipped: {e!r}")
+                continue
+            res.update({'backend': backend, 'threads': getattr(engine, 'num_threads', None), 'sz_wh': list(cfg.sz_wh)})
+            results.append(res)
+            lprint('bench_detector', f"{backend:>12} threads={res['threads']}: {res['fps']:6.1f} fps  p50 {res['p50_ms']:7.2f}ms  p99 {res['p99_ms']:7.2f}ms")
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from ultralytics import YOLO
+
+from siri.global_config import GlobalConfig as cfg
+from siri.global_config import GloablStatus
+from siri.utils.logger import lprint
+from siri.utils.timing import TimingHistogram
+from siri.utils.tracer import tracer
+from siri.utils.device import use_device
+from siri.vision.capture import ReplayCapture
+from siri.vision.geometry import geometry_to_monitor
+
+
+STAGES = ('detect', 'step', 'plot', 'total')
+
+
+def build(args):
+    from siri.vision.detector import ScrDetector
+    from siri.vision.visualizer import Visualizer
+    from siri.strategy.operator import AgentStateMachine, use_null_input_devices
+
+    use_null_input_devices()
+    model = YOLO(args.model, task='detect')
+    detector = ScrDetector(model)
+    sm = AgentStateMachine(model_path=args.policy, realtime=False)
+    visualizer = Visualizer()
+    visualizer.save_video = None
+    return detector, sm, visualizer
+
+
+def run(args):
+    """
+    feeds recorded frames synchronously through
+    ScrDetector.infer -> AgentStateMachine.step -> Visualizer.plot, input devices stubbed
+    """
+    use_device(args.device)
+    if args.detection_cache is not None:
+        cfg.detection_cache_threshold = args.detection_cache
+    cfg.cascade = cfg.cascade or args.cascade
+    tracer.enabled = args.trace or args.chrome_trace is not None
+
+    detector, sm, visualizer = build(args)
+    hists = {name: TimingHistogram(name, capacity=args.n_frames or 4096) for name in STAGES}
+
+    backend = ReplayCapture(args.source, loop=args.n_frames is not None)
+    GloablStatus.monitor = geometry_to_monitor(backend.geometry())
+    frame = np.empty(tuple(reversed(cfg.sz_wh)) + (3,), dtype=np.uint8)
+    n = 0
+    wall0 = None
+    with backend:
+        while args.n_frames is None or n < args.n_frames + args.warmup:
+            try:
+                backend.grab(GloablStatus.monitor, out=frame)
+            except EOFError:
+                break
+            if n == args.warmup:
+                wall0 = time.perf_counter()
+                for h in hists.values(): h.reset()
+                tracer.reset()
+                detector.det_cache.reset_stats()
+                if detector.cascade is not None: detector.cascade.reset_stats()
+
+            t0 = time.perf_counter()
+            packet = detector.infer(frame)
+            t1 = time.perf_counter()
+            data = sm.step(packet['obs']) if packet is not None else None
+            t2 = time.perf_counter()
+            if packet is not None:
+                visualizer.plot(packet['sv_source'], data)
+                detector.discard(packet)
+            t3 = time.perf_counter()
+
+            hists['detect'].record(t1 - t0)
+            hists['step'].record(t2 - t1)
+            hists['plot'].record(t3 - t2)
+            hists['total'].record(t3 - t0)
+            n += 1
+    GloablStatus.monitor = None
+
+    n_timed = hists['total'].count
+    wall = time.perf_counter() - wall0 if wall0 is not None else 0.
+    report = {
+        'source': args.source,
+        'model': args.model,
+        'device': str(cfg.device),
+        'half': cfg.half,
+        'sz_wh': list(cfg.sz_wh),
+        'n_frames': n_timed,
+        'warmup': args.warmup,
+        'throughput_fps': n_timed / wall if wall > 0 else 0.,
+        'stages': {name: h.summary() for name, h in hists.items()},
+    }
+    for name in STAGES:
+        lprint('bench_replay', str(hists[name]))
+    report['hud_checks'] = detector.hud.summaries()
+    report['detection_cache'] = detector.det_cache.stats()
+    if detector.cascade is not None:
+        report['roi_cascade'] = detector.cascade.stats()
+    if tracer.enabled:
+        report['spans'] = tracer.summaries()
+        lprint('bench_replay', '\n' + tracer.summary())
+    if args.chrome_trace is not None:
+        tracer.dump_chrome_trace(args.chrome_trace)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay recorded frames through Detector -> Operator -> Visualizer")
+    parser.add_argument('source', help="video file or frame directory, e.g. a trajectory's FRAME_raw.d")
+    parser.add_argument('--model', default=f"{cfg.root_dir}/model/ScrGrabber-tick1-sunone-compat/best.pt")
+    parser.add_argument('--policy', default=None, help="AgentStateMachine weights, random init when omitted")
+    parser.add_argument('--device', default=None, help="defaults to cfg.device, cpu when cuda is unavailable")
+    parser.add_argument('--n-frames', type=int, default=None, help="loop the source until n frames are timed")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--json', default=None, help="write the report here instead of stdout")
+    parser.add_argument('--detection-cache', type=float, default=None, help="cfg.detection_cache_threshold, 0 runs yolo on every frame")
+    parser.add_argument('--cascade', action='store_true', help="detect in crops around tracked targets between full scans")
+    parser.add_argument('--trace', action='store_true', help="break the stages down into tracer spans")
+    parser.add_argument('--chrome-trace', default=None, help="dump the spans as a chrome://tracing json, implies --trace")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ from torch.distributions.categorical import Categorical
 from UTIL.tensor_ops import _2tensor
 from UTIL.colorful import *
 from imitation.utils import print_dict
+from siri.utils.device import device_policy
 
 def get_a_logger():
     from VISUALIZE.mcom import mcom, logdir
@@ -24,7 +25,7 @@ def get_a_logger():
 
 class AlgorithmConfig:
     logdir = './imitation_TRAIN/BC/'
-    device = 'cuda'
+    device = None  # None follows siri.utils.device.device_policy
     
     sample_size = 100
 
@@ -41,11 +42,14 @@ class AlgorithmConfig:
     mcom = get_a_logger()
     
 
+def algorithm_device():
+    return AlgorithmConfig.device if AlgorithmConfig.device is not None else device_policy.device
+
 
 class wasd_xy_Trainer():
     def __init__(self, policy: torch.nn.Module):
         self.policy = policy
-        self.policy.to(AlgorithmConfig.device)
+        self.policy.to(algorithm_device())
         self.lr = AlgorithmConfig.lr
         self.all_parameter = list(policy.named_parameters())
 
@@ -111,7 +115,7 @@ class wasd_xy_Trainer():
 
             loss = cross_entropy_loss + dist_entropy_loss
 
-            if epoch==0: print('[bc.py] Memory Allocated %.2f GB'%(torch.cuda.memory_allocated()/1073741824))
+            if epoch==0: print('[bc.py] Memory Allocated %.2f GB'%(device_policy.memory_allocated_gb()))
             loss.backward()
             self.optimizer.step()
             if self.sheduler:
@@ -174,7 +178,7 @@ class wasd_xy_Trainer():
 
         # dir 1
         pt_path = '%s/model.pt' % AlgorithmConfig.logdir
-        cpt = torch.load(pt_path, map_location=AlgorithmConfig.device)
+        cpt = torch.load(pt_path, map_location=algorithm_device())
         self.policy.load_state_dict(cpt['policy'], strict=True)
         # https://github.com/pytorch/pytorch/issues/3852
         self.optimizer.load_state_dict(cpt['optimizer'])
@@ -2,7 +2,7 @@ import time, cv2, mss, os
 import numpy as np
 from pynput import keyboard, mouse
 
-from siri.utils.sleeper import Sleeper
+from siri.utils.sleeper import TickScheduler
 from siri.vision.detector import ScrGrabber
 from siri.global_config import GloablStatus, GlobalConfig as cfg
 from siri.utils.logger import lprint, lprint_
@@ -92,22 +92,10 @@ class Grabber(ScrGrabber):
         return traj
 
     def start_dataset_session(self):
-        geometry = self.get_scrcpy_window_geometry()
-        if not geometry:
-            lprint(self, "scrcpy window not found")
+        if not self.open_monitor():
             lprint(self, "start_session failed")
             return
 
-        assert GloablStatus.monitor is None
-        left, top, scr_width, scr_height = geometry
-
-        GloablStatus.monitor = {
-            "top": top,
-            "left": left,
-            "width": scr_width,
-            "height": scr_height,
-        }
-
         
 
         # Initialize listeners
@@ -136,6 +124,8 @@ class Grabber(ScrGrabber):
                 traj = self.new_traj()
                 self.last_frame, self.last_frame_time = grab_screen()
                 time.sleep(self.tick)
+                # skip, never catch up: each step asserts the previous frame is less than 2 ticks old
+                sleeper = TickScheduler(tick=self.tick, user=self, policy='skip')
 
 
                 global start, stop, new_mouse_pos, last_mouse_pos, actions
@@ -155,6 +145,7 @@ class Grabber(ScrGrabber):
                         
                         self.last_frame, self.last_frame_time = grab_screen()
                         time.sleep(self.tick)
+                        sleeper.reset()
                     start = 0
 
                     if traj.time_pointer == self.traj_limit:
@@ -163,7 +154,6 @@ class Grabber(ScrGrabber):
 
 
                     print绿('\r'+lprint_(self, f"started, traj collected: {len(self.traj_pool)}"), end='')
-                    sleeper = Sleeper(tick=self.tick, user=self)
                     
                     assert time.time_ns() - self.last_frame_time < 2 * self.tick * 1e9
                     traj.remember('FRAME_raw', self.last_frame.copy())
@@ -201,7 +191,7 @@ class Grabber(ScrGrabber):
                 self.traj_pool.append(traj)
 
             # cv2.destroyAllWindows()
-            GloablStatus.monitor = None
+            self.close_monitor()
             GloablStatus.stop_event.set()
             for i in range(len(self.traj_pool)): self.traj_pool[i].cut_tail()
             pool_name = f"{self.__class__.__name__}-tick={self.tick}-limit={self.traj_limit}-{time.strftime("%Y%m%d-%H:%M:%S")}"
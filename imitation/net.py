@@ -8,6 +8,8 @@ from torchvision.transforms import Compose
 from torchsummary import summary
 from torchvision.models import efficientnet_b0
 from siri.utils.logger import lprint
+from siri.utils.tracer import traced
+from siri.utils.device import device_policy
 from siri.vision.preprocess import crop_wh, pre_transform_crop, crop
 from imitation.discretizer import SimpleDiscretizer, wasd_Discretizer
 from imitation.utils import iterable_eq
@@ -22,11 +24,11 @@ Y_D_MAX=200
 
 from .transform import center_transform_train, center_transform_test
 
-def load_model(m, pt_path, device='cuda'):
+def load_model(m, pt_path, device=None):
     if not os.path.exists(pt_path): 
         assert False, "file does not exists"
 
-    cpt = torch.load(pt_path, map_location=device)
+    cpt = torch.load(pt_path, map_location=device if device is not None else device_policy.device)
     m.load_state_dict(cpt['policy'], strict=True)
     print绿(f'loaded model {pt_path}')
     return m
@@ -213,7 +215,7 @@ class NetActor(nn.Module):
             assert image.shape[0] == 3
             return image
         im = [trans(img) for img in im]
-        im = torch.stack(im).to('cuda').float()
+        im = device_policy.to(torch.stack(im)).float()
         if not cls._showed:
             for i in range(5):
                 im0 = ((im[i].cpu().permute(1, 2, 0).numpy() + 1)/2 * 255).astype(np.uint8)[..., ::-1]
@@ -244,6 +246,7 @@ class NetActor(nn.Module):
             NetActor.y_discretizer.n_actions
         )
 
+    @traced('net_act')
     def act(self, frames):
         assert len(frames) == 1
 
@@ -257,7 +260,7 @@ class NetActor(nn.Module):
         return wasd, np.array([x, y])
     
     def load_model(self, path):
-        self.net = load_model(self.net, path, device='cuda')
+        self.net = load_model(self.net, path)
 
 
 
@@ -273,6 +276,17 @@ class DVNetBase(nn.Module):
 
     CENTER_SZ_WH = (400, 189,)
 
+    def attach_midas(self):
+        """
+        private copy of the zoo's midas_small_256 as midas_pretrained / midas_scratch: the submodules stay
+        in state_dict as before, and train() / load_state_dict() / .to() never touch the shared instance
+        """
+        from siri.vision.midas import depth_zoo
+        midas_model = copy.deepcopy(depth_zoo.get('midas_small_256').model)
+        midas_model.eval()
+        self.midas_pretrained = midas_model.pretrained
+        self.midas_scratch = midas_model.scratch
+
     @staticmethod
     def get_center(frame):
         if not iterable_eq(frame.shape, (578, 1280, 3)):
@@ -320,7 +334,7 @@ class DVNetBase(nn.Module):
             assert image.shape[0] == 3
             return image
         midas = torch.stack([midas_trans(oneimg) for oneimg in im]) 
-        midas.to('cuda').float()
+        midas = device_policy.to(midas).float()
     
 
         def trans(image):
@@ -330,7 +344,7 @@ class DVNetBase(nn.Module):
             assert image.shape[0] == 3
             return image
         im = torch.stack([trans(img) for img in im])
-        im = im.to('cuda').float()
+        im = device_policy.to(im).float()
 
         if not cls._showed:
             for i in range(5):
@@ -367,7 +381,7 @@ class DVNetBase(nn.Module):
         return wasd, np.array([x, y])
     
     def load_model(self, path):
-        self.net = load_model(self.net, path, device='cuda')
+        self.net = load_model(self.net, path)
 
 
 class DVNet(DVNetBase):
@@ -376,13 +390,8 @@ class DVNet(DVNetBase):
         self.input_frame_shape = (3,) + tuple(reversed(input_sz_wh))
         lprint(self, f"input frame shape: {self.input_frame_shape}, if it's changed, errors may occur")
     
-        from midas.midas_net_custom import MidasNet_small
-        local_model_path = './midas_v21_small_256.pt'
-        assert os.path.exists(local_model_path)
-        midas_model = MidasNet_small(path=local_model_path, features=64, backbone="efficientnet_lite3", exportable=True, non_negative=True, blocks={'expand': True})
-        midas_model.eval()
-        self.midas_pretrained = midas_model.pretrained
-        self.midas_scratch = midas_model.scratch
+        # private copy of the MidasNet_small the depth zoo loads once
+        self.attach_midas()
         
 
         base_model = efficientnet_b0(weights='IMAGENET1K_V1')
@@ -462,13 +471,8 @@ class DVNet2(DVNetBase):
         self.input_frame_shape = (3,) + tuple(reversed(input_sz_wh))
         lprint(self, f"input frame shape: {self.input_frame_shape}, if it's changed, errors may occur")
     
-        from midas.midas_net_custom import MidasNet_small
-        local_model_path = './midas_v21_small_256.pt'
-        assert os.path.exists(local_model_path)
-        midas_model = MidasNet_small(path=local_model_path, features=64, backbone="efficientnet_lite3", exportable=True, non_negative=True, blocks={'expand': True})
-        midas_model.eval()
-        self.midas_pretrained = midas_model.pretrained
-        self.midas_scratch = midas_model.scratch
+        # private copy of the MidasNet_small the depth zoo loads once
+        self.attach_midas()
         
 
         base_model = efficientnet_b0(weights='IMAGENET1K_V1')
@@ -551,13 +555,8 @@ class DVNet3(DVNetBase):
         self.input_frame_shape = (3,) + tuple(reversed(input_sz_wh))
         lprint(self, f"input frame shape: {self.input_frame_shape}, if it's changed, errors may occur")
     
-        from midas.midas_net_custom import MidasNet_small
-        local_model_path = './midas_v21_small_256.pt'
-        assert os.path.exists(local_model_path)
-        midas_model = MidasNet_small(path=local_model_path, features=64, backbone="efficientnet_lite3", exportable=True, non_negative=True, blocks={'expand': True})
-        midas_model.eval()
-        self.midas_pretrained = midas_model.pretrained
-        self.midas_scratch = midas_model.scratch
+        # private copy of the MidasNet_small the depth zoo loads once
+        self.attach_midas()
         
         base_model1 = efficientnet_b0(weights='IMAGENET1K_V1')
         base_model2 = efficientnet_b0(weights='IMAGENET1K_V1')
@@ -649,13 +648,8 @@ class DVNet4(DVNetBase):
         self.input_frame_shape = (3,) + tuple(reversed(input_sz_wh))
         lprint(self, f"input frame shape: {self.input_frame_shape}, if it's changed, errors may occur")
     
-        from midas.midas_net_custom import MidasNet_small
-        local_model_path = './midas_v21_small_256.pt'
-        assert os.path.exists(local_model_path)
-        midas_model = MidasNet_small(path=local_model_path, features=64, backbone="efficientnet_lite3", exportable=True, non_negative=True, blocks={'expand': True})
-        midas_model.eval()
-        self.midas_pretrained = midas_model.pretrained
-        self.midas_scratch = midas_model.scratch
+        # private copy of the MidasNet_small the depth zoo loads once
+        self.attach_midas()
         
 
         base_model2 = efficientnet_b0(weights='IMAGENET1K_V1')
@@ -11,6 +11,7 @@ from UTIL.colorful import *
 from imitation.utils import print_dict
 from imitation.bc import AlgorithmConfig, wasd_xy_Trainer
 from siri.utils.logger import lprint_
+from siri.utils.device import device_policy
 
 def t3n(x):
     return float(x.detach().mean().to("cpu").numpy())
@@ -18,7 +19,7 @@ def t3n(x):
 class FullTrainer(wasd_xy_Trainer):
     def __init__(self, policy):
         super().__init__(policy)
-        self.scaler = torch.amp.GradScaler('cuda', init_scale = 2.0**16)
+        self.scaler = device_policy.grad_scaler(init_scale = 2.0**16)
 
     def train_on_data_(self, data: dict):
         """ BC """
@@ -41,15 +42,15 @@ class FullTrainer(wasd_xy_Trainer):
                 self.optimizer.zero_grad()
 
                 try:
-                    with torch.amp.autocast_mode.autocast("cuda", dtype=torch.float16):
+                    with device_policy.autocast():
                         loss, log = self.establish_torch_graph(obs, act)
 
-                    if epoch==0: print('[bc.py] Memory Allocated %.2f GB'%(torch.cuda.memory_allocated()/1073741824))
+                    if epoch==0: print('[bc.py] Memory Allocated %.2f GB'%(device_policy.memory_allocated_gb()))
                     self.scaler.scale(loss).backward()
                     # del loss; torch.cuda.empty_cache()
                     self.scaler.step(self.optimizer)
                     self.scaler.update()
-                    del loss; torch.cuda.empty_cache()
+                    del loss; device_policy.empty_cache()
                     not_pass = False
                 except torch.OutOfMemoryError:
                     print亮红(lprint_(self, f"Error: cuda out of memory, sample_size={sample_size}"))
@@ -82,7 +83,7 @@ class FullTrainer(wasd_xy_Trainer):
         self.log_trivial_finalize()
         self.mcv.rec(self.epoch_cnt, 'time')
         self.mcv.rec_show()
-        torch.cuda.empty_cache()
+        device_policy.empty_cache()
                 
         update_cnt = int(self.epoch_cnt/AlgorithmConfig.num_epoch_per_update)
         print(f"update {update_cnt} finished")
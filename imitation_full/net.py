@@ -8,6 +8,8 @@ from torchvision.transforms import Compose
 from torchsummary import summary
 from torchvision.models import efficientnet_b0, efficientnet_b5
 from siri.utils.logger import lprint
+from siri.utils.tracer import traced
+from siri.utils.device import device_policy
 from siri.vision.preprocess import crop_wh, pre_transform_crop, crop
 from imitation.discretizer import SimpleDiscretizer, wasd_Discretizer
 from imitation.utils import iterable_eq
@@ -22,11 +24,11 @@ Y_D_MAX=200
 
 from imitation.transform import center_transform_train, center_transform_test
 
-def load_model(m, pt_path, device='cuda'):
+def load_model(m, pt_path, device=None):
     if not os.path.exists(pt_path): 
         assert False, "file does not exists"
 
-    cpt = torch.load(pt_path, map_location=device)
+    cpt = torch.load(pt_path, map_location=device if device is not None else device_policy.device)
     m.load_state_dict(cpt['policy'], strict=True)
     print绿(f'loaded model {pt_path}')
     return m
@@ -51,7 +53,7 @@ class NetActor(nn.Module):
             assert image.shape[0] == 3
             return image
         im = [trans(img) for img in im]
-        im = torch.stack(im).to('cuda').float()
+        im = device_policy.to(torch.stack(im)).float()
         if not cls._showed:
             for i in range(5):
                 im0 = ((im[i].cpu().permute(1, 2, 0).numpy() + 1)/2 * 255).astype(np.uint8)[..., ::-1]
@@ -77,6 +79,7 @@ class NetActor(nn.Module):
         super(NetActor, self).__init__()
 
 
+    @traced('net_act')
     def act(self, frames):
         assert len(frames) == 1
 
@@ -91,7 +94,7 @@ class NetActor(nn.Module):
         return wasd, np.array([x, y])
     
     def load_model(self, path):
-        self.net = load_model(self.net, path, device='cuda')
+        self.net = load_model(self.net, path)
 
 
 
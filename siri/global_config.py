@@ -16,16 +16,78 @@ class GlobalConfig:
     conf_threshold = 0.33
     half = True
     tick = 0.04
+    tick_policy = 'skip'  # TickScheduler after an overrun: 'skip' missed ticks or 'catch_up'
     # tick = 0.05
     # tick = 1
     # sz_wh = (640, 360,)
     sz_wh = (1280, 578)
 
     manual_preprocess=False
+    predict_fast_path = True  # InferenceEngine: skip model.predict() setup for frames shaped like sz_wh
+    predict_batch_size = 8  # max frames per forward pass in InferenceEngine
+    detector_backend = 'torch'  # 'torch', or 'onnxruntime' / 'openvino' for cpu deployment
+    onnx_cache_dir = 'model/.onnx_cache'  # exported models keyed by weight hash, relative to root_dir
+    onnx_threads = None  # cpu threads for onnxruntime / openvino, None uses every available core
+    # skip YOLO on frames that barely changed since the last detection (siri.vision.detection_cache)
+    # off by default: a small target moving inside one thumbnail cell may not move it past the threshold,
+    # measure the skip rate and misses with bench_replay.py --detection-cache before turning it on
+    detection_cache_threshold = 0  # max gray level change of a thumbnail cell, e.g. 6; <= 0 disables the cache
+    detection_cache_max_skip = 2  # full detection after this many reused frames in a row
+    detection_cache_thumb_wh = (64, 32)
+    # between full frame scans, detect in a crop around the tracked targets (siri.vision.roi_cascade)
+    cascade = False
+    cascade_roi_wh = (512, 288)  # crop size, also the imgsz of the crop engine, multiples of 32
+    cascade_min_conf = 0.5  # tracks at or above this confidence are followed
+    cascade_full_every = 10  # full frame scan after this many crops in a row
+    cascade_margin = 0.5  # followed box + margin * its size must fit the crop
+    cascade_classes = (0, 1)
+
+    # capture / inference / consumer run as separate stages joined by latest-value slots
+    pipeline = True
+    stage_report_interval = 10.  # seconds, <= 0 to disable
+    frame_ring_size = 12  # preallocated capture buffers shared by detector, operator and visualizer
+    visualizer_queue_size = 4  # frames / acts waiting to be paired by seq in the visualizer
+    visualizer_unpaired_after = 1.  # seconds without a paired frame before frames are shown without their act
+    # Visualizer session recording, encoded in a background thread (siri.vision.recorder)
+    record_video = True
+    record_fourcc = 'mp4v'  # e.g. 'mp4v', 'avc1', 'MJPG', 'XVID'; must suit the container
+    record_container = 'mp4'  # file extension, e.g. 'mp4', 'avi', 'mkv'
+    record_scale = 1.  # < 1 downsizes recorded frames
+    record_every = 1  # keep one frame out of every n
+    record_segment_s = 0.  # new file every n seconds of video, <= 0 for a single file
+    record_queue_size = 8  # frames waiting for the encoder, further frames are dropped
+
+    capture_backend = 'mss'  # 'mss', 'xdamage' or 'replay'
+    replay_source = None  # video file or frame directory for the replay backend
+    geometry_poll_interval = 1.  # seconds between window geometry checks
+
+    # DeepPredictor in its own thread (siri.vision.depth_worker), detection never waits for depth
+    depth_async = True
+    depth_interval = 0.2  # seconds between depth estimates
+    depth_model = 'midas_small_256'  # siri.vision.midas.DEPTH_MODELS
+    depth_variant = 'eager'  # 'eager', 'half' or 'traced', see DepthModelZoo
+    depth_cache_dir = 'model/.depth_cache'  # traced depth models, relative to root_dir
+    depth_render = False  # draw the depth regions into deep_frame, only needed when it is displayed
+    depth_batch_transform = True  # DeepPredictor preprocessing as batched tensor ops (midas.BatchDepthTransform)
+
+    # span tracing (siri.utils.tracer), near free when disabled
+    trace = False
+    trace_report_interval = 10.  # seconds, <= 0 to disable
+    trace_capacity = 1024  # samples kept per span name
+    trace_max_events = 100000  # latest spans kept for dump_chrome_trace
+    trace_mcom = False  # also plot span p50s through VISUALIZE.mcom
+    trace_chrome_file = None  # dump a chrome trace here when a session ends
+
+    hud_sample_step = 1  # HUD colour checks (siri.vision.roi_stats) look at every n-th row / column
 
     body_y_offset = 0.1
+    # ObsMaker target selection, weighted scorers from siri.vision.target_selector.TARGET_SCORERS:
+    # 'distance', 'size', 'class_priority', 'track_age'; e.g. (('distance', 1.), ('track_age', .2, {'max_age': 10}))
+    target_scorers = (('distance', 1.),)
 
-    plt = 'qt'
+    plt = 'qt'  # 'qt', 'cv2', 'plt', 'none' (headless, e.g. only recording) or 'shm' (external viewer.py)
+    shm_name = 'siri-visualizer'  # shared memory ring of annotated frames for plt = 'shm'
+    shm_slots = 4
 
     yolo_plt = False
 
@@ -1,27 +1,60 @@
 import math, random, time
+import enum
 import threading
 # import uinput
 import numpy as np
-from pynput.mouse import Controller as MouseController, Button
-from pynput.keyboard import Controller as KBController
+try:
+    from pynput.mouse import Controller as MouseController, Button
+    from pynput.keyboard import Controller as KBController
+except ImportError:
+    # no X server (e.g. replay benchmarks), only the null devices below can be used
+    MouseController = KBController = None
+    class Button(enum.Enum):
+        left = 1
+        right = 3
 
 from siri.global_config import GloablStatus
 from siri.global_config import GlobalConfig as cfg
 from siri.utils.logger import lprint
-from siri.utils.sleeper import Sleeper
+from siri.utils.sleeper import TickScheduler
+from siri.utils.frame_ring import release_frame
+from siri.utils.pipeline import Mailbox, StageStats, StatsReporter
+from siri.utils.tracer import traced, tracer
+from siri.utils.device import device_policy
 
 
 
 
 
+class NullMouse:
+    """input device stub, counts calls instead of moving the real cursor"""
+    def __init__(self):
+        self.n_events = 0
+
+    def move(self, dx, dy): self.n_events += 1
+    def press(self, button): self.n_events += 1
+    def release(self, button): self.n_events += 1
+    def click(self, button, count=1): self.n_events += 1
+
+
+class NullKB:
+    def __init__(self):
+        self.n_events = 0
+
+    def press(self, key): self.n_events += 1
+    def release(self, key): self.n_events += 1
+
+
 class KB:
-    kb = KBController()
+    kb = KBController() if KBController is not None else NullKB()
     kb_bt = None
 
+@traced('keys')
 def hit_kb_bt(key):
     KB.kb.press(key)
     KB.kb.release(key)
 
+@traced('keys')
 def press_kb_bt(key):
     if KB.kb_bt is None:
         print(f'[press_kb_bt] {key}')
@@ -33,6 +66,7 @@ def press_kb_bt(key):
         KB.kb_bt = key
         KB.kb.press(key)
 
+@traced('keys')
 def unpress_kb_bt():
     if KB.kb_bt is None:
         pass
@@ -45,7 +79,16 @@ def is_pressing():
     return KB.kb_bt is not None
 
 
-mouse = MouseController()
+mouse = MouseController() if MouseController is not None else NullMouse()
+
+def use_null_input_devices():
+    global mouse
+    mouse = NullMouse()
+    KB.kb = NullKB()
+    KB.kb_bt = None
+    return mouse, KB.kb
+
+@traced('mouse')
 def move_mouse(move_x, move_y):
     if abs(move_x) < 0.1 and abs(move_y) < 0.1:
         return  # abort
@@ -292,12 +335,15 @@ class StateMachine(StateMachineBase):
         if self.USE_MODEL:
             from imitation.net import NetActor, LSTMNet
             self.model_tick = 0.1
-            self.model = NetActor(LSTMNet).to('cuda')
+            # one tick per search step, re-anchored by reset() when the step starts waiting
+            self.model_scheduler = TickScheduler(tick=self.model_tick - cfg.tick, user=self)
+            self.model = NetActor(LSTMNet).to(device_policy.device)
             self.model.load_model("./imitation_TRAIN/BC/model-LSTMNet-sample=50-pretrained-13856-augft.pt")
             self.model.eval()
             self.model.net.reset()
 
   
+    @traced('sm_step')
     def step(self, obs: dict):
         assert 'in_scope' in obs
         assert 'deep_frame' in obs
@@ -369,7 +415,7 @@ class StateMachine(StateMachineBase):
             if self._last_fire_t > 2 and self._last_search_t > SEARCH_W_T:
                 if self.USE_MODEL:
                     assert self.model_tick > cfg.tick
-                    slp = Sleeper(tick = self.model_tick - cfg.tick)
+                    slp = self.model_scheduler; slp.reset()
                     need_slp = True
 
                     in_search = True
@@ -489,8 +535,15 @@ class StateMachine(StateMachineBase):
 
 
 class AgentStateMachine(StateMachineBase):
-    def __init__(self):
+    DEFAULT_MODEL_PATH = "./imitation_TRAIN/BC/model-LSTMNet-nav-old-pure-50000-navft-20000-frtlnavft-45000-pp19+nav-60000.pt"
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, realtime=True):
+        """
+        model_path: None keeps the randomly initialized policy (benchmarks)
+        realtime: False skips the model_tick sleeps inside step (replay benchmarks)
+        """
         super(AgentStateMachine, self).__init__()
+        self.realtime = realtime
         self.aimer = Aimer()
         self.kb_sm_lesure = KBStateMachine()
         self.kb_sm_fight = KBStateMachine()
@@ -500,8 +553,11 @@ class AgentStateMachine(StateMachineBase):
 
         from imitation.net import NetActor, LSTMNet
         self.model_tick = 0.1
-        self.model = NetActor(LSTMNet).to(cfg.device)
-        self.model.load_model("./imitation_TRAIN/BC/model-LSTMNet-nav-old-pure-50000-navft-20000-frtlnavft-45000-pp19+nav-60000.pt")
+        # one tick per search step, re-anchored by reset() when the step starts waiting
+        self.model_scheduler = TickScheduler(tick=self.model_tick - cfg.tick, user=self)
+        self.model = NetActor(LSTMNet).to(device_policy.device)
+        if model_path is not None:
+            self.model.load_model(model_path)
         # self.model.load_model("./imitation_TRAIN/BC/model-LSTMNet-nav-old-pure-50000-navft-20000-frtlnavft-40000.pt")
         # self.model.load_model("./imitation_TRAIN/BC/model-LSTMNet-nav-old-pure-50000-navft-45000.pt")
         # self.model.load_model("./imitation_TRAIN/BC/model-LSTMNet-nav-old-pure-50000.pt")
@@ -516,6 +572,7 @@ class AgentStateMachine(StateMachineBase):
         }
 
 
+    @traced('sm_step')
     def step(self, obs: dict):
         assert 'in_scope' in obs
         assert 'deep_frame' in obs
@@ -586,7 +643,7 @@ class AgentStateMachine(StateMachineBase):
 
             if self._last_fire_t > 1 and self._last_search_t > SEARCH_W_T:
                 assert self.model_tick > cfg.tick
-                slp = Sleeper(tick = self.model_tick - cfg.tick)
+                slp = self.model_scheduler; slp.reset()
                 need_slp = True
 
                 in_search = True
@@ -647,23 +704,24 @@ class AgentStateMachine(StateMachineBase):
         #     unpress_kb_bt()
         
 
-        for k in ['w', 'a', 's', 'd']:
-            if act_dict[k] > 0:
-                if self.in_press[k] <= 0: 
-                    KB.kb.press(k)
-                    self.in_press[k] = 1
-            else: 
-                if self.in_press[k] > 0:
-                    KB.kb.release(k)
-                    self.in_press[k] = 0
+        with tracer.span('keys'):
+            for k in ['w', 'a', 's', 'd']:
+                if act_dict[k] > 0:
+                    if self.in_press[k] <= 0: 
+                        KB.kb.press(k)
+                        self.in_press[k] = 1
+                else: 
+                    if self.in_press[k] > 0:
+                        KB.kb.release(k)
+                        self.in_press[k] = 0
                 
         if need_slp:
             # coef = 1.4            # mv_x, mv_y = mv_x * coef, mv_y * coef
             mv_x, mv_y = mv_x/3, mv_y/3
             move_mouse(mv_x, mv_y)
-            slp.sleep_half()
+            if self.realtime: slp.sleep_half()
             move_mouse(mv_x, mv_y)
-            slp.sleep()
+            if self.realtime: slp.sleep()
         move_mouse(mv_x, mv_y)
 
         
@@ -702,8 +760,10 @@ class KBStateMachine:
 class Operator(threading.Thread):
     def __init__(self, draw_action_hook=None):
         super().__init__()
-        self.obs: dict = None
-        self.obs_ready_mutex = threading.Semaphore(value=0)
+        # newest obs from the detector, older ones not taken in time are dropped
+        self.mailbox = Mailbox('obs')
+        # step time, and age of the obs's frame when its act is out (reaction latency)
+        self.stats = StageStats('operator')
         self.draw_action_hook = draw_action_hook
 
         self.sm = AgentStateMachine()
@@ -713,33 +773,46 @@ class Operator(threading.Thread):
 
     def run(self):
         lprint(self, "start")
+        reporter = StatsReporter([self.mailbox.stats, self.stats])
+        reporter.add_slot(self.mailbox)
         try:
             while not GloablStatus.stop_event.is_set():
-                self.obs_ready_mutex.acquire(timeout = 3 * cfg.tick)
-                if self.obs is None: 
-                    self.draw_action_hook(None)
-                    lprint(self, "Warning: obs is None, abort")
+                reporter.maybe_report()
+                letter = self.mailbox.get(deadline=time.monotonic() + 3 * cfg.tick)
+                if letter is None:
+                    if self.mailbox.n_put > 0:
+                        lprint(self, f"Warning: no obs for {3 * cfg.tick:.2f}s")
                     continue
+                obs = letter.item
 
                 if time.time() - self.start_time < 5:
-                    self.draw_action_hook(None)
+                    release_frame(obs)
                     continue
 
-                obs = self.obs; self.obs = None
-
+                t0 = time.monotonic()
                 data = self.sm.step(obs)
+                data['seq'] = obs['seq']
+                release_frame(obs)
+                t1 = time.monotonic()
+                self.stats.record(t1 - t0, age=t1 - letter.t)
 
                 self.draw_action_hook(data)
         except KeyboardInterrupt:
             lprint(self, "Sig INT catched, stopping session.")
         finally:
-            self.obs = None
+            self.mailbox.close()
+            letter = self.mailbox.get(timeout=0)
+            if letter is not None:
+                release_frame(letter.item)
         lprint(self, "finish")
 
     def see_obs(self, obs: dict):
         lprint(self, "see_obs called", debug=True)
 
         assert isinstance(obs, dict)
-        last_obs = self.obs; self.obs = obs
-        if last_obs is None:
-            self.obs_ready_mutex.release()
+        if self.mailbox.closed:
+            release_frame(obs)
+            return
+        dropped = self.mailbox.put(obs, t=obs.get('t_grab'))
+        # not consumed in time, give its frame back to the ring
+        release_frame(dropped)
@@ -0,0 +1,87 @@
+import torch
+import contextlib
+
+from siri.utils.logger import lprint
+from siri.global_config import GlobalConfig as cfg
+
+
+class DevicePolicy:
+    """
+    The one place deciding where tensors live and in which dtype, consulted by siri and imitation
+    instead of hard-coded 'cuda'. Follows cfg.device / cfg.half, falling back to cpu (fp32) when cuda
+    is asked for but unavailable, so everything also runs on cpu-only hosts.
+
+    Small per-frame math (box selection, pixel counts) should stay in numpy, only large tensors
+    (images, network inputs) go through to().
+    """
+    def __init__(self):
+        self._cuda_available = None
+        self._warned = False
+
+    @property
+    def cuda_available(self):
+        if self._cuda_available is None:
+            self._cuda_available = torch.cuda.is_available()
+        return self._cuda_available
+
+    @property
+    def device(self) -> torch.device:
+        device = torch.device(cfg.device)
+        if device.type == 'cuda' and not self.cuda_available:
+            if not self._warned:
+                self._warned = True
+                lprint(self, f"Warning: cfg.device={cfg.device} but cuda is unavailable, running on cpu")
+            return torch.device('cpu')
+        return device
+
+    @property
+    def is_cuda(self):
+        return self.device.type == 'cuda'
+
+    @property
+    def half(self):
+        """fp16 inference only makes sense on cuda"""
+        return bool(cfg.half) and self.is_cuda
+
+    @property
+    def dtype(self):
+        return torch.float16 if self.half else torch.float32
+
+    def to(self, x: torch.Tensor, dtype=None):
+        """moves a (large) tensor to the policy device, non blocking from pinned memory"""
+        return x.to(self.device, dtype=dtype, non_blocking=self.is_cuda and x.is_pinned())
+
+    def autocast(self):
+        """mixed precision on cuda, a no-op context on cpu"""
+        if self.is_cuda:
+            return torch.amp.autocast('cuda', dtype=torch.float16)
+        return contextlib.nullcontext()
+
+    def grad_scaler(self, **kwargs):
+        return torch.amp.GradScaler(self.device.type, enabled=self.is_cuda, **kwargs)
+
+    def empty_cache(self):
+        if self.is_cuda:
+            torch.cuda.empty_cache()
+
+    def memory_allocated_gb(self):
+        if self.is_cuda:
+            return torch.cuda.memory_allocated(self.device) / 1073741824
+        return 0.
+
+
+device_policy = DevicePolicy()
+
+
+def use_device(device=None, half=None):
+    """
+    sets cfg.device / cfg.half for the whole stack, e.g. from a --device flag;
+    device None keeps cfg.device unless cuda is unavailable
+    """
+    if device is not None:
+        cfg.device = device
+    cfg.device = str(device_policy.device)
+    if half is not None:
+        cfg.half = half
+    cfg.half = device_policy.half
+    return device_policy
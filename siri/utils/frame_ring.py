@@ -0,0 +1,84 @@
+import threading
+import numpy as np
+from collections import deque
+
+from siri.utils.logger import lprint
+
+
+class FrameRef:
+    """
+    引用计数的帧缓冲, 由 FrameRing 分配
+    持有者用完后必须 release(), 计数归零时缓冲回到 ring 中复用
+    """
+    def __init__(self, ring, index, array: np.ndarray):
+        self.ring = ring
+        self.index = index
+        self.array = array
+        self.seq = -1
+        self.t_grab = 0.
+        self._refcnt = 0
+
+    def retain(self):
+        self.ring._retain(self)
+        return self
+
+    def release(self):
+        self.ring._release(self)
+
+    @property
+    def refcnt(self):
+        return self._refcnt
+
+
+class FrameRing:
+    def __init__(self, shape, n_slots=12, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._refs = [FrameRef(self, i, np.empty(self.shape, dtype=dtype)) for i in range(n_slots)]
+        self._free = deque(range(n_slots))
+        self._seq = 0
+
+        self.n_overflow = 0
+
+    def acquire(self) -> FrameRef:
+        """取一个空闲缓冲, 计数为 1; ring 耗尽时临时分配一块(不回收)"""
+        with self._lock:
+            if len(self._free) > 0:
+                ref = self._refs[self._free.popleft()]
+            else:
+                self.n_overflow += 1
+                if self.n_overflow == 1 or self.n_overflow % 100 == 0:
+                    lprint(self, f"Warning: ring exhausted {self.n_overflow} times, some holder is not releasing frames")
+                ref = FrameRef(self, -1, np.empty(self.shape, dtype=self.dtype))
+            ref._refcnt = 1
+            ref.seq = self._seq
+            self._seq += 1
+        return ref
+
+    def _retain(self, ref: FrameRef):
+        with self._lock:
+            assert ref._refcnt > 0, "retain on a released frame"
+            ref._refcnt += 1
+
+    def _release(self, ref: FrameRef):
+        with self._lock:
+            if ref._refcnt <= 0:
+                lprint(self, f"Warning: frame {ref.seq} released too many times")
+                return
+            ref._refcnt -= 1
+            if ref._refcnt == 0 and ref.index >= 0:
+                self._free.append(ref.index)
+
+    @property
+    def n_free(self):
+        return len(self._free)
+
+
+def release_frame(data):
+    """释放 obs / sv_source 字典中持有的帧引用"""
+    if data is None:
+        return
+    ref = data.pop('frame_ref', None)
+    if ref is not None:
+        ref.release()
@@ -1,7 +1,9 @@
 import sys
+import cv2
 import numpy as np
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout
 from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import QCoreApplication
 
 
 class ImageWindow(QWidget):
@@ -22,4 +24,50 @@ class ImageWindow(QWidget):
         # q_image = QImage(image_data.data, width, height, bytes_per_line, QImage.Format_RGB888)
         q_image = QImage(image_data.data, width, height, bytes_per_line, QImage.Format_BGR888)  # use cv2 BGR format 
         pixmap = QPixmap.fromImage(q_image)
-        self.label.setPixmap(pixmap)
\ No newline at end of file
+        self.label.setPixmap(pixmap)
+
+class FrameDisplay:
+    """
+    In process viewer of BGR frames, mode: 'qt', 'cv2', 'plt' or 'none' (headless, show() does nothing).
+    Qt and matplotlib windows are created on the first frame, in the calling thread.
+    """
+    def __init__(self, mode, title):
+        if mode not in ('qt', 'cv2', 'plt', 'none'):
+            raise NotImplementedError(mode)
+        self.mode = mode
+        self.title = title
+        self.img = None
+
+    def show(self, frame):
+        if self.mode == 'plt':
+            from matplotlib import pyplot as plt
+            if self.img is None:
+                self.fig, ax = plt.subplots()
+                ax.set_title(self.title)
+                self.img = ax.imshow(frame)
+                ax.axis('off')
+                plt.ion()
+                plt.show()
+            self.img.set_data(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            self.fig.canvas.draw()
+            self.fig.canvas.flush_events()
+        elif self.mode == 'cv2':
+            cv2.imshow(self.title, frame)
+            cv2.waitKey(1)
+            self.img = self.title
+        elif self.mode == 'qt':
+            if self.img is None:
+                # WARNING: QApplication is not in the main() thread when called from Visualizer.run, viewer.py avoids that
+                self.app = QApplication(sys.argv)
+                self.img = ImageWindow(title=self.title)
+                self.img.show()
+            self.img.update_image(frame)
+            self.app.processEvents()
+
+    def close(self):
+        if self.mode == 'qt' and self.img is not None:
+            app = QCoreApplication.instance()
+            if app is not None:
+                app.quit()
+        elif self.mode == 'cv2' and self.img is not None:
+            cv2.destroyWindow(self.title)
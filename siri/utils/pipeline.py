@@ -0,0 +1,191 @@
+import time
+import threading
+from collections import namedtuple
+
+from siri.utils.logger import lprint
+from siri.global_config import GloablStatus
+from siri.global_config import GlobalConfig as cfg
+
+
+class LatestSlot:
+    """
+    单槽队列, 只保留最新的值, 未被取走的旧值直接丢弃(计入 n_dropped)
+    """
+    def __init__(self, name='slot'):
+        self.name = name
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self._closed = False
+
+        self.n_put = 0
+        self.n_dropped = 0
+
+    def put(self, item):
+        """放入新值, 返回被挤掉的旧值(没有则为 None)"""
+        with self._cond:
+            dropped = None
+            if self._has_item:
+                dropped = self._item
+                self.n_dropped += 1
+            self._item = item
+            self._has_item = True
+            self.n_put += 1
+            self._cond.notify()
+        return dropped
+
+    def get(self, timeout=None):
+        """取走最新值, 超时或关闭时返回 None"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._has_item or self._closed, timeout=timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.sum_t = 0.
+        self.max_t = 0.
+        self.sum_age = 0.
+        self.max_age = 0.
+        self._since = time.monotonic()
+
+    def record(self, dt, age=None):
+        with self._lock:
+            self.n += 1
+            self.sum_t += dt
+            self.max_t = max(self.max_t, dt)
+            if age is not None:
+                self.sum_age += age
+                self.max_age = max(self.max_age, age)
+
+    def summary(self, reset=True):
+        with self._lock:
+            elapsed = max(time.monotonic() - self._since, 1e-6)
+            buff = f"{self.name}: {self.n / elapsed:.1f}fps"
+            if self.n > 0:
+                buff += f" mean={self.sum_t / self.n * 1e3:.1f}ms max={self.max_t * 1e3:.1f}ms"
+                if self.sum_age > 0:
+                    buff += f" age={self.sum_age / self.n * 1e3:.1f}ms max_age={self.max_age * 1e3:.1f}ms"
+            if reset:
+                self.reset()
+        return buff
+
+
+Letter = namedtuple('Letter', ['seq', 't', 'item'])
+
+
+class Mailbox(LatestSlot):
+    """
+    带序号和时间戳的单槽信箱: put 时编号 (seq 连续递增, 中间缺的就是被挤掉的),
+    t 为内容的产生时间 (如帧的 t_grab), get 返回 Letter(seq, t, item);
+    stats 记录每次 get 的等待时间和取走时的年龄
+    """
+    def __init__(self, name='mailbox'):
+        super().__init__(name)
+        self.stats = StageStats(name)
+        self._seq = 0
+        self.last_seq = -1  # seq of the last letter taken
+
+    def put(self, item, t=None):
+        """放入新值, 返回被挤掉的旧值(没有则为 None)"""
+        with self._cond:
+            letter = Letter(self._seq, time.monotonic() if t is None else t, item)
+            self._seq += 1
+            dropped = super().put(letter)
+        return None if dropped is None else dropped.item
+
+    def get(self, timeout=None, deadline=None):
+        """取走最新的 Letter, 最多等到 deadline (time.monotonic) 或 timeout 秒, 超时或关闭时返回 None"""
+        t0 = time.monotonic()
+        if deadline is not None:
+            timeout = max(deadline - t0, 0.)
+        letter = super().get(timeout=timeout)
+        if letter is None:
+            return None
+        self.last_seq = letter.seq
+        t1 = time.monotonic()
+        self.stats.record(t1 - t0, age=t1 - letter.t)
+        return letter
+
+    def age(self, letter: Letter):
+        """letter 内容的当前年龄 (秒)"""
+        return time.monotonic() - letter.t
+
+
+class Stage(threading.Thread):
+    """
+    流水线的一级: 从 in_slot 取值, 调用 func, 结果放入 out_slot(若有)
+    in_slot 中的元素为 (t_grab, item), t_grab 用于计算帧龄
+    """
+    def __init__(self, name, func, in_slot: LatestSlot, out_slot: LatestSlot=None, on_drop=None):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.in_slot = in_slot
+        self.out_slot = out_slot
+        self.on_drop = on_drop
+        self.stats = StageStats(name)
+
+    def run(self):
+        try:
+            while not GloablStatus.stop_event.is_set() and not self.in_slot.closed:
+                packet = self.in_slot.get(timeout=3 * cfg.tick)
+                if packet is None:
+                    continue
+                t_grab, item = packet
+
+                t0 = time.monotonic()
+                result = self.func(item)
+                t1 = time.monotonic()
+                self.stats.record(t1 - t0, age=t1 - t_grab)
+
+                if self.out_slot is not None and result is not None:
+                    dropped = self.out_slot.put((t_grab, result))
+                    if dropped is not None and self.on_drop is not None:
+                        self.on_drop(dropped[1])
+        except Exception as e:
+            lprint(self, f"Error: {self.name} stage crashed, {e!r}")
+            GloablStatus.stop_event.set()
+            raise
+
+
+class StatsReporter:
+    def __init__(self, stats_list, interval=None):
+        self.stats_list = stats_list
+        self.slots = []
+        self.interval = interval if interval is not None else cfg.stage_report_interval
+        self._last = time.monotonic()
+
+    def add_slot(self, slot: LatestSlot):
+        self.slots.append(slot)
+
+    def maybe_report(self):
+        if self.interval is None or self.interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        buff = ' | '.join(stats.summary() for stats in self.stats_list)
+        if len(self.slots) > 0:
+            buff += ' | dropped: ' + ', '.join(f"{slot.name}={slot.n_dropped}" for slot in self.slots)
+        lprint(self, buff)
@@ -0,0 +1,161 @@
+import json
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+from siri.utils.logger import lprint
+
+
+MAGIC = 0x53495249  # 'SIRI'
+HEADER_BYTES = 64
+SLOT_HEADER_BYTES = 64
+
+
+class _Layout:
+    """
+    共享内存布局:
+      header: magic, n_slots, max_h, max_w, channels, meta_bytes, head (最新写入的 seq, -1 为空)
+      每个 slot: [gen_begin, gen_end, h, w, t, meta_len] + meta (json) + 帧数据
+    写入端先写 gen_begin, 再写数据, 最后写 gen_end; 读取端先读 gen_end, 拷贝后再读 gen_begin,
+    两者相等说明拷贝期间没有被覆盖 (seqlock)
+    """
+    def __init__(self, buf, n_slots, max_h, max_w, channels, meta_bytes):
+        self.n_slots, self.max_h, self.max_w, self.channels, self.meta_bytes = n_slots, max_h, max_w, channels, meta_bytes
+        self.frame_bytes = max_h * max_w * channels
+        self.slot_bytes = SLOT_HEADER_BYTES + meta_bytes + self.frame_bytes
+        self.header = np.ndarray((8,), dtype=np.int64, buffer=buf, offset=0)
+        self.slot_headers, self.metas, self.frames = [], [], []
+        for i in range(n_slots):
+            offset = HEADER_BYTES + i * self.slot_bytes
+            self.slot_headers.append(np.ndarray((8,), dtype=np.int64, buffer=buf, offset=offset))
+            self.metas.append(np.ndarray((meta_bytes,), dtype=np.uint8, buffer=buf, offset=offset + SLOT_HEADER_BYTES))
+            self.frames.append(np.ndarray((self.frame_bytes,), dtype=np.uint8, buffer=buf, offset=offset + SLOT_HEADER_BYTES + meta_bytes))
+
+    @staticmethod
+    def size(n_slots, max_h, max_w, channels, meta_bytes):
+        return HEADER_BYTES + n_slots * (SLOT_HEADER_BYTES + meta_bytes + max_h * max_w * channels)
+
+    @property
+    def head(self):
+        return int(self.header[6])
+
+
+class ShmFrameWriter:
+    """
+    Publishes frames (uint8, up to max_shape) with a json metadata dict to a shared memory ring that
+    any number of ShmFrameReader processes can attach to by name. write() never waits for readers,
+    a slow reader skips frames (the ring keeps the n_slots newest). Single writer.
+    """
+    def __init__(self, name, max_shape, n_slots=4, meta_bytes=4096):
+        max_h, max_w = max_shape[:2]
+        channels = max_shape[2] if len(max_shape) > 2 else 1
+        size = _Layout.size(n_slots, max_h, max_w, channels, meta_bytes)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left behind by a crashed session
+            lprint(self, f"Warning: shared memory {name} already exists, replacing it")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close(); stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.layout = _Layout(self.shm.buf, n_slots, max_h, max_w, channels, meta_bytes)
+        self.layout.header[:] = [MAGIC, n_slots, max_h, max_w, channels, meta_bytes, -1, 0]
+        for slot_header in self.layout.slot_headers:
+            slot_header[:] = -1
+        self._seq = 0
+        self.n_dropped = 0
+
+    def write(self, frame: np.ndarray, meta: dict=None):
+        """returns the ring seq of the frame, None when it does not fit and is dropped"""
+        L = self.layout
+        h, w = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim > 2 else 1
+        meta = json.dumps(meta if meta is not None else {}).encode()
+        if h > L.max_h or w > L.max_w or channels != L.channels or len(meta) > L.meta_bytes or frame.dtype != np.uint8:
+            self.n_dropped += 1
+            if self.n_dropped == 1:
+                lprint(self, f"Warning: frame {frame.shape} {frame.dtype} or meta ({len(meta)}B) does not fit {self.name}, dropped")
+            return None
+        seq = self._seq
+        i = seq % L.n_slots
+        slot_header = L.slot_headers[i]
+        slot_header[0] = seq  # gen_begin
+        np.copyto(L.frames[i][:h * w * channels].reshape(frame.shape), frame)
+        L.metas[i][:len(meta)] = np.frombuffer(meta, dtype=np.uint8)
+        slot_header[2:6] = [h, w, time.monotonic_ns(), len(meta)]
+        slot_header[1] = seq  # gen_end
+        L.header[6] = seq
+        self._seq += 1
+        return seq
+
+    def close(self):
+        self.layout = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ShmFrameReader:
+    """attaches to a ShmFrameWriter by name, read() copies the newest frame out"""
+    def __init__(self, name):
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # python < 3.13: the resource tracker would unlink the writer's memory when this process exits
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.name = name
+        header = np.ndarray((8,), dtype=np.int64, buffer=self.shm.buf)
+        magic, n_slots, max_h, max_w, channels, meta_bytes = (int(v) for v in header[:6])
+        if magic != MAGIC:
+            self.shm.close()
+            raise ValueError(f"{name} is not a siri frame ring")
+        self.layout = _Layout(self.shm.buf, n_slots, max_h, max_w, channels, meta_bytes)
+        self._out = None
+        self.n_torn = 0
+
+    def read(self, after=-1):
+        """
+        (seq, frame, meta) of the newest frame if its seq > after, else None.
+        frame is a private copy in a buffer of the reader, valid until the next read.
+        """
+        L = self.layout
+        for _ in range(L.n_slots):
+            seq = L.head
+            if seq <= after:
+                return None
+            i = seq % L.n_slots
+            slot_header = L.slot_headers[i]
+            if int(slot_header[1]) != seq:
+                self.n_torn += 1
+                continue
+            h, w, t_ns, meta_len = (int(v) for v in slot_header[2:6])
+            shape = (h, w, L.channels) if L.channels > 1 else (h, w)
+            if self._out is None or self._out.shape != shape:
+                self._out = np.empty(shape, dtype=np.uint8)
+            frame = self._out
+            np.copyto(frame, L.frames[i][:h * w * L.channels].reshape(shape))
+            meta = bytes(L.metas[i][:meta_len])
+            if int(slot_header[0]) != seq:
+                # overwritten while copying
+                self.n_torn += 1
+                continue
+            meta = json.loads(meta)
+            meta['t_write'] = t_ns * 1e-9
+            return seq, frame, meta
+        return None
+
+    def wait(self, after=-1, timeout=None, poll=0.002):
+        """read() that polls until a frame newer than after arrives, None on timeout"""
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            res = self.read(after)
+            if res is not None:
+                return res
+            if t_end is not None and time.monotonic() >= t_end:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        self.layout = None
+        self.shm.close()
@@ -1,5 +1,6 @@
 import time
 from .logger import lprint
+from .timing import TimingHistogram
 from siri.global_config import GlobalConfig as cfg
 
 
@@ -28,4 +29,117 @@ class Sleeper:
             buffer = f'warning: tick time out {sleep_time}s'
             if self.user is not None:
                 buffer += f", caller is {self.user.__class__.__name__}"
-            lprint(self, buffer)
\ No newline at end of file
+            lprint(self, buffer)
+
+class TickScheduler:
+    """
+    Paces a loop on absolute monotonic deadlines t0 + k * tick, so a late iteration does not push
+    back every later one as a fresh Sleeper per iteration does.
+
+    policy, what to do after an overrun:
+        'skip': drop the missed ticks, the next deadline is the first grid point still ahead
+        'catch_up': keep the grid, run the missed ticks back to back, at most max_catch_up of them
+
+    stats: jitter (how late sleep() wakes up) and overrun (how far behind a deadline the loop got)
+    """
+    POLICIES = ('skip', 'catch_up')
+
+    def __init__(self, tick=None, user=None, policy=None, max_catch_up=3, stop_event=None, warn_interval=5.):
+        policy = policy if policy is not None else cfg.tick_policy
+        assert policy in self.POLICIES, policy
+        self.tick = tick if tick is not None else cfg.tick
+        self.user = user
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.stop_event = stop_event
+        self.warn_interval = warn_interval
+        self.jitter = TimingHistogram('jitter', capacity=1024)
+        self.overrun = TimingHistogram('overrun', capacity=1024)
+        self._last_warn = 0.
+        self.reset_stats()
+        self.reset()
+
+    def reset(self):
+        """restart the grid from now, e.g. after a pause"""
+        self._deadline = time.monotonic() + self.tick
+
+    def reset_stats(self):
+        self.jitter.reset()
+        self.overrun.reset()
+        self.n_ticks = 0
+        self.n_skipped = 0
+        self._n_overruns_warned = 0
+        self._stats_since = time.monotonic()
+
+    @property
+    def deadline(self):
+        return self._deadline
+
+    def _wait(self, delay):
+        if self.stop_event is not None:
+            self.stop_event.wait(delay)
+        else:
+            time.sleep(delay)
+
+    def sleep(self):
+        """wait for the current deadline, then advance to the next one"""
+        now = time.monotonic()
+        delay = self._deadline - now
+        if delay > 0:
+            self._wait(delay)
+            self.jitter.record(time.monotonic() - self._deadline)
+            self._deadline += self.tick
+        else:
+            self._on_overrun(now, -delay)
+        self.n_ticks += 1
+
+    def sleep_fraction(self, fraction=0.5):
+        """wait until `fraction` of the current tick has elapsed, the deadline is not advanced"""
+        delay = self._deadline - (1. - fraction) * self.tick - time.monotonic()
+        if delay > 0:
+            self._wait(delay)
+
+    def sleep_half(self):
+        self.sleep_fraction(0.5)
+
+    def _on_overrun(self, now, late):
+        self.overrun.record(late)
+        missed = int(late // self.tick)
+        if self.policy == 'skip' or missed >= self.max_catch_up:
+            self.n_skipped += missed
+            self._deadline += (missed + 1) * self.tick
+        else:
+            self._deadline += self.tick
+
+        if now - self._last_warn > self.warn_interval:
+            self._last_warn = now
+            buffer = f"warning: tick time out {-late:.4f}s, {self.overrun.count - self._n_overruns_warned} overruns since last warning"
+            if self.user is not None:
+                buffer += f", caller is {self.user.__class__.__name__}"
+            self._n_overruns_warned = self.overrun.count
+            lprint(self, buffer)
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self._stats_since, 1e-6)
+        jitter = self.jitter.summary()
+        return {
+            'tick': self.tick,
+            'policy': self.policy,
+            'n_ticks': self.n_ticks,
+            'rate': self.n_ticks / elapsed,
+            'n_overruns': self.overrun.count,
+            'n_skipped': self.n_skipped,
+            'jitter_p50_ms': jitter.get('p50_ms', 0.),
+            'jitter_p99_ms': jitter.get('p99_ms', 0.),
+            'overrun_max_ms': self.overrun.summary().get('max_ms', 0.),
+        }
+
+    def summary(self, reset=True):
+        """one line, same shape as StageStats.summary so it can sit in a StatsReporter"""
+        s = self.stats()
+        name = self.user.__class__.__name__ if self.user is not None else 'tick'
+        buff = (f"{name} tick: {s['rate']:.1f}/{1 / self.tick:.1f}Hz jitter p50={s['jitter_p50_ms']:.2f}ms p99={s['jitter_p99_ms']:.2f}ms"
+                f" overruns={s['n_overruns']} skipped={s['n_skipped']}")
+        if reset:
+            self.reset_stats()
+        return buff
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+# histogram bin edges in ms, roughly log spaced
+HIST_EDGES_MS = (0., 0.25, 0.5, 1., 2., 4., 8., 16., 32., 64., 128., 256., 512., 1024., float('inf'))
+
+
+class TimingHistogram:
+    """
+    Ring buffer of the latest `capacity` durations (seconds) with percentile / histogram summaries.
+    Recording is O(1) and allocation free.
+    """
+    def __init__(self, name, capacity=4096):
+        self.name = name
+        self._buf = np.zeros(capacity, dtype=np.float64)
+        self._idx = 0
+        self.count = 0
+        self.total = 0.
+
+    def record(self, dt):
+        self._buf[self._idx] = dt
+        self._idx = (self._idx + 1) % len(self._buf)
+        self.count += 1
+        self.total += dt
+
+    def samples(self):
+        if self.count < len(self._buf):
+            return self._buf[:self.count]
+        return np.roll(self._buf, -self._idx)
+
+    def reset(self):
+        self._idx = 0
+        self.count = 0
+        self.total = 0.
+
+    def summary(self):
+        """all times in ms, percentiles are over the samples still in the ring"""
+        x = self.samples() * 1e3
+        if len(x) == 0:
+            return {'name': self.name, 'count': 0}
+        counts, _ = np.histogram(x, bins=HIST_EDGES_MS)
+        return {
+            'name': self.name,
+            'count': self.count,
+            'mean_ms': float(x.mean()),
+            'p50_ms': float(np.percentile(x, 50)),
+            'p90_ms': float(np.percentile(x, 90)),
+            'p99_ms': float(np.percentile(x, 99)),
+            'max_ms': float(x.max()),
+            'hist_edges_ms': [e for e in HIST_EDGES_MS[:-1]],
+            'hist_counts': counts.tolist(),
+        }
+
+    def __str__(self):
+        s = self.summary()
+        if s['count'] == 0:
+            return f"{self.name}: n=0"
+        return f"{self.name}: n={s['count']} mean={s['mean_ms']:.2f}ms p50={s['p50_ms']:.2f}ms p99={s['p99_ms']:.2f}ms max={s['max_ms']:.2f}ms"
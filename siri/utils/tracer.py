@@ -0,0 +1,148 @@
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+from siri.utils.logger import lprint
+from siri.utils.timing import TimingHistogram
+from siri.global_config import GlobalConfig as cfg
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 't0')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record_ns(self.name, self.t0, time.perf_counter_ns())
+        return False
+
+
+class Tracer:
+    """
+    Span timers with ring-buffered histograms per span name.
+    Disabled (cfg.trace = False) span() returns a shared no-op context, so instrumented code
+    only pays one attribute check.
+
+    exports:
+        maybe_report(): periodic one-line-per-span summary (and mcom curves when cfg.trace_mcom)
+        dump_chrome_trace(path): chrome://tracing / Perfetto trace-event JSON of the latest spans
+    """
+    def __init__(self, enabled=None, capacity=None, max_events=None):
+        self.enabled = cfg.trace if enabled is None else enabled
+        self.capacity = capacity if capacity is not None else cfg.trace_capacity
+        self.hists: dict[str, TimingHistogram] = {}
+        self.events = deque(maxlen=max_events if max_events is not None else cfg.trace_max_events)
+        self._lock = threading.Lock()
+        self._t_start = time.monotonic()
+        self._last_report = time.monotonic()
+        self.mcv = None
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def traced(self, name=None):
+        """decorator version of span(), the name defaults to the function's qualname"""
+        def decorator(func):
+            span_name = name if name is not None else func.__qualname__
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_ns(self, name, t0_ns, t1_ns):
+        with self._lock:
+            hist = self.hists.get(name)
+            if hist is None:
+                hist = self.hists[name] = TimingHistogram(name, capacity=self.capacity)
+            hist.record((t1_ns - t0_ns) / 1e9)
+            self.events.append((name, t0_ns // 1000, (t1_ns - t0_ns) // 1000, threading.get_ident()))
+
+    def reset(self):
+        with self._lock:
+            self.hists = {}
+            self.events.clear()
+
+    def summaries(self):
+        with self._lock:
+            return {name: hist.summary() for name, hist in self.hists.items()}
+
+    def summary(self):
+        with self._lock:
+            return '\n'.join(str(hist) for hist in self.hists.values())
+
+    def attach_mcom(self, mcv=None):
+        if mcv is None:
+            from VISUALIZE.mcom import mcom, logdir
+            mcv = mcom(path='%s/tracer/' % logdir,
+                       digit=-1,
+                       rapid_flush=True,
+                       draw_mode='Img',
+                       tag='[tracer.py]',
+                       resume_mod=False)
+            mcv.rec_init(color='b')
+        self.mcv = mcv
+        return mcv
+
+    def maybe_report(self):
+        if not self.enabled or cfg.trace_report_interval is None or cfg.trace_report_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_report < cfg.trace_report_interval:
+            return
+        self._last_report = now
+
+        summaries = self.summaries()
+        lprint(self, '\n' + self.summary())
+        if cfg.trace_mcom:
+            if self.mcv is None:
+                self.attach_mcom()
+            self.mcv.rec(now - self._t_start, 'time')
+            for name, s in summaries.items():
+                if s['count'] > 0:
+                    self.mcv.rec(s['p50_ms'], f"{name} p50 ms")
+            self.mcv.rec_show()
+
+    def dump_chrome_trace(self, path):
+        with self._lock:
+            events = list(self.events)
+        trace = {
+            'traceEvents': [
+                {'name': name, 'ph': 'X', 'ts': ts, 'dur': dur, 'pid': 0, 'tid': tid}
+                for (name, ts, dur, tid) in events
+            ],
+            'displayTimeUnit': 'ms',
+        }
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+        lprint(self, f"chrome trace with {len(events)} spans saved to {path}")
+
+
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
@@ -0,0 +1,285 @@
+import os
+import cv2
+import glob
+import time
+import numpy as np
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+
+
+class CaptureBackend:
+    """
+    Screen capture backend. grab() writes a BGR frame of cfg.sz_wh into out in place.
+    Backends must be opened in the thread that grabs (mss / Xlib handles are not thread safe).
+    """
+    name = 'base'
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def geometry(self):
+        """(left, top, width, height) of the source, None when it should follow the scrcpy window"""
+        return None
+
+    def grab(self, monitor: dict, out: np.ndarray=None) -> np.ndarray:
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _alloc_out(out):
+        if out is None:
+            out = np.empty(tuple(reversed(cfg.sz_wh)) + (3,), dtype=np.uint8)
+        assert out.shape[-1] == 3, 'not a BGR format'
+        return out
+
+
+class MssCapture(CaptureBackend):
+    name = 'mss'
+
+    def __init__(self):
+        self.sct = None
+        self._bgr_buffer = None
+
+    def open(self):
+        import mss
+        self.sct = mss.mss()
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+    def grab(self, monitor, out=None):
+        out = self._alloc_out(out)
+        screenshot = self.sct.grab(monitor)
+        # view the raw BGRA bytes, np.array(screenshot) would copy
+        frame = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+
+        if frame.shape[:2] == out.shape[:2]:
+            cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=out)
+        else:
+            if self._bgr_buffer is None or self._bgr_buffer.shape[:2] != frame.shape[:2]:
+                self._bgr_buffer = np.empty(frame.shape[:2] + (3,), dtype=np.uint8)
+            cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=self._bgr_buffer)
+            cv2.resize(self._bgr_buffer, cfg.sz_wh, dst=out)
+        return out
+
+
+class XDamageCapture(CaptureBackend):
+    """
+    Keeps a persistent copy of the monitor and only transfers the rectangles reported
+    by the X DAMAGE extension since the last grab. Requires python-xlib.
+    python-xlib has no MIT-SHM binding, so dirty rects are fetched with XGetImage, merged into
+    their bounding box so a grab costs at most one round trip to the server.
+    """
+    name = 'xdamage'
+
+    def __init__(self):
+        self.display = None
+        self._bgr_buffer = None
+        self._monitor_key = None
+        self._dirty = []
+        self.n_rects = 0
+        self.n_pixels = 0
+
+    def open(self):
+        from Xlib import display as xdisplay
+        from Xlib.ext import damage
+        self._damage_ext = damage
+        self.display = xdisplay.Display()
+        if not self.display.has_extension('DAMAGE'):
+            self.display.close()
+            self.display = None
+            raise RuntimeError("X server has no DAMAGE extension")
+        self.display.damage_query_version()
+        self.root = self.display.screen().root
+        self.damage = self.root.damage_create(damage.DamageReportRawRectangles)
+        self.display.flush()
+
+    def close(self):
+        if self.display is not None:
+            self.display.damage_destroy(self.damage)
+            self.display.close()
+            self.display = None
+
+    def _collect_damage(self, left, top, width, height):
+        while self.display.pending_events() > 0:
+            ev = self.display.next_event()
+            if not isinstance(ev, self._damage_ext.DamageNotify):
+                continue
+            a = ev.area
+            x0, y0 = max(a.x, left), max(a.y, top)
+            x1, y1 = min(a.x + a.width, left + width), min(a.y + a.height, top + height)
+            if x1 > x0 and y1 > y0:
+                self._dirty.append((x0 - left, y0 - top, x1 - x0, y1 - y0))
+        self.display.damage_subtract(self.damage)
+
+    def _fetch(self, left, top, x, y, w, h):
+        from Xlib import X
+        reply = self.root.get_image(left + x, top + y, w, h, X.ZPixmap, 0xffffffff)
+        bgra = np.frombuffer(reply.data, dtype=np.uint8).reshape(h, w, 4)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=self._bgr_buffer[y:y+h, x:x+w])
+        self.n_rects += 1
+        self.n_pixels += w * h
+
+    def grab(self, monitor, out=None):
+        out = self._alloc_out(out)
+        left, top, width, height = monitor['left'], monitor['top'], monitor['width'], monitor['height']
+
+        key = (left, top, width, height)
+        if self._monitor_key != key:
+            # window moved or resized, everything is dirty
+            self._monitor_key = key
+            self._bgr_buffer = np.empty((height, width, 3), dtype=np.uint8)
+            self._dirty = [(0, 0, width, height)]
+
+        self._collect_damage(left, top, width, height)
+        if self._dirty:
+            x0 = min(x for x, _, _, _ in self._dirty)
+            y0 = min(y for _, y, _, _ in self._dirty)
+            x1 = max(x + w for x, _, w, _ in self._dirty)
+            y1 = max(y + h for _, y, _, h in self._dirty)
+            self._fetch(left, top, x0, y0, x1 - x0, y1 - y0)
+        self._dirty = []
+
+        if self._bgr_buffer.shape[:2] == out.shape[:2]:
+            np.copyto(out, self._bgr_buffer)
+        else:
+            cv2.resize(self._bgr_buffer, cfg.sz_wh, dst=out)
+        return out
+
+
+class ReplayCapture(CaptureBackend):
+    """
+    Replays recorded frames as if they were grabbed from the screen.
+    source: a video file, a directory of images (e.g. a trajectory's FRAME_raw.d) or a trajectory dir
+    """
+    name = 'replay'
+
+    IMG_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, source=None, loop=True):
+        self.source = source if source is not None else cfg.replay_source
+        assert self.source is not None, "replay backend needs a source, set cfg.replay_source"
+        self.loop = loop
+        self.cap = None
+        self.files = None
+        self.index = 0
+        self.exhausted = False
+
+    @classmethod
+    def _list_images(cls, path):
+        def frame_index(f):
+            stem = os.path.splitext(os.path.basename(f))[0]
+            tail = stem.rsplit('_', 1)[-1]
+            return (int(tail), f) if tail.isdigit() else (-1, f)
+        files = [f for f in glob.glob(os.path.join(path, '**', '*'), recursive=True) if f.lower().endswith(cls.IMG_EXTS)]
+        return sorted(files, key=frame_index)
+
+    def open(self):
+        if os.path.isdir(self.source):
+            self.files = self._list_images(self.source)
+            assert len(self.files) > 0, f"no image found in {self.source}"
+        else:
+            assert os.path.exists(self.source), f"{self.source} does not exist"
+            self.cap = cv2.VideoCapture(self.source)
+            assert self.cap.isOpened(), f"cannot open {self.source}"
+        self.index = 0
+        self.exhausted = False
+        lprint(self, f"replaying {self.source}")
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def geometry(self):
+        w, h = cfg.sz_wh
+        return 0, 0, w, h
+
+    def _read(self):
+        if self.files is not None:
+            if self.index >= len(self.files):
+                if not self.loop:
+                    return None
+                self.index = 0
+            frame = cv2.imread(self.files[self.index])
+            self.index += 1
+            return frame
+        ok, frame = self.cap.read()
+        if not ok:
+            if not self.loop:
+                return None
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+            if not ok:
+                return None
+        self.index += 1
+        return frame
+
+    def grab(self, monitor, out=None):
+        out = self._alloc_out(out)
+        frame = self._read()
+        if frame is None:
+            self.exhausted = True
+            raise EOFError("replay source exhausted")
+        if frame.shape[:2] == out.shape[:2]:
+            np.copyto(out, frame)
+        else:
+            cv2.resize(frame, cfg.sz_wh, dst=out)
+        return out
+
+
+CAPTURE_BACKENDS = {
+    MssCapture.name: MssCapture,
+    XDamageCapture.name: XDamageCapture,
+    ReplayCapture.name: ReplayCapture,
+}
+
+
+def make_capture_backend(name=None, **kwargs) -> CaptureBackend:
+    name = name if name is not None else cfg.capture_backend
+    if name not in CAPTURE_BACKENDS:
+        raise NotImplementedError(f"unknown capture backend '{name}', choose from {list(CAPTURE_BACKENDS)}")
+    return CAPTURE_BACKENDS[name](**kwargs)
+
+
+def bench_capture(backend: CaptureBackend, monitor: dict, n_frames=300, warmup=10):
+    """
+    grab n_frames back to back into a preallocated buffer
+    :return: dict with fps, p50/p99 grab latency (ms) and process CPU% over the run
+    """
+    out = np.empty(tuple(reversed(cfg.sz_wh)) + (3,), dtype=np.uint8)
+    latencies = np.zeros(n_frames, dtype=np.float64)
+    with backend:
+        for _ in range(warmup):
+            backend.grab(monitor, out=out)
+
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        for i in range(n_frames):
+            t0 = time.perf_counter()
+            backend.grab(monitor, out=out)
+            latencies[i] = time.perf_counter() - t0
+        wall = time.perf_counter() - wall0
+        cpu = time.process_time() - cpu0
+
+    return {
+        'backend': backend.name,
+        'sz_wh': list(cfg.sz_wh),
+        'monitor': dict(monitor),
+        'n_frames': n_frames,
+        'fps': n_frames / wall,
+        'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+        'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+        'cpu_percent': cpu / wall * 100,
+    }
@@ -0,0 +1,92 @@
+import time
+import threading
+import numpy as np
+
+from siri.global_config import GlobalConfig as cfg
+from siri.global_config import GloablStatus
+from siri.utils.logger import lprint
+from siri.utils.sleeper import TickScheduler
+from siri.utils.pipeline import LatestSlot, StageStats
+from siri.utils.frame_ring import FrameRef
+
+
+class DepthWorker(threading.Thread):
+    """
+    Runs a depth predictor (DeepPredictor) in its own thread, every `interval` seconds on the latest
+    submitted frame, and publishes (deep_obs, deep_frame, t) where t is the grab time of the frame
+    the depth comes from. submit() and latest() never wait for the model, before the first result
+    latest() answers with `fallback` (e.g. FakeDeepPredictor).
+    """
+    def __init__(self, predictor, fallback, interval=None):
+        super().__init__(name='depth', daemon=True)
+        self.predictor = predictor
+        self.fallback = fallback
+        self.interval = interval if interval is not None else cfg.depth_interval
+        self.stats = StageStats('depth')
+        self._slot = LatestSlot('depth')
+        self._lock = threading.Lock()
+        self._latest = None
+        # set while the worker waits for a frame, frames submitted in between are not needed
+        self._wanted = True
+
+    def submit(self, frame, t_frame=None):
+        """frame: FrameRef (retained until used) or ndarray (copied), ignored unless the worker is due"""
+        if not self._wanted or self._slot.closed:
+            return
+        if self.ident is None:
+            self.start()
+        if isinstance(frame, FrameRef):
+            t_frame = frame.t_grab if t_frame is None else t_frame
+            item = frame.retain()
+        else:
+            item = frame.copy()
+        t_frame = time.monotonic() if t_frame is None else t_frame
+        dropped = self._slot.put((t_frame, item))
+        if dropped is not None and isinstance(dropped[1], FrameRef):
+            dropped[1].release()
+
+    def latest(self, frame: np.ndarray):
+        """(deep_obs, deep_frame, t) of the newest depth result, the fallback's for `frame` (t=None) before it"""
+        with self._lock:
+            latest = self._latest
+        if latest is None:
+            deep_obs, deep_frame = self.fallback.predict(frame)
+            return deep_obs, deep_frame, None
+        deep_obs, deep_frame, t = latest
+        return dict(deep_obs), deep_frame, t
+
+    def run(self):
+        scheduler = TickScheduler(tick=self.interval, user=self, stop_event=GloablStatus.stop_event)
+        try:
+            while not GloablStatus.stop_event.is_set() and not self._slot.closed:
+                self._wanted = True
+                packet = self._slot.get(timeout=max(self.interval, 3 * cfg.tick))
+                if packet is None:
+                    continue
+                self._wanted = False
+                t_frame, item = packet
+                t0 = time.monotonic()
+                try:
+                    deep_obs, deep_frame = self.predictor.predict(item.array if isinstance(item, FrameRef) else item)
+                finally:
+                    if isinstance(item, FrameRef):
+                        item.release()
+                t1 = time.monotonic()
+                self.stats.record(t1 - t0, age=t1 - t_frame)
+                with self._lock:
+                    self._latest = (deep_obs, deep_frame, t_frame)
+                scheduler.sleep()
+        except Exception as e:
+            lprint(self, f"Error: depth worker crashed, {e!r}")
+            raise
+        finally:
+            self._wanted = False
+            self._slot.close()
+            packet = self._slot.get(timeout=0)
+            if packet is not None and isinstance(packet[1], FrameRef):
+                packet[1].release()
+
+    def stop(self, timeout=1.):
+        self._slot.close()
+        if self.is_alive():
+            self.join(timeout=timeout)
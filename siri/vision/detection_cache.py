@@ -0,0 +1,91 @@
+import cv2
+import threading
+import numpy as np
+
+from siri.global_config import GlobalConfig as cfg
+
+
+class DetectionCache:
+    """
+    Decides per frame whether YOLO has to run, and keeps the detections of the last full run.
+    Frames are reduced to a small grayscale thumbnail (cv2.INTER_AREA, so every cell is the mean of
+    a block of pixels, of every few rows) and compared with the thumbnail of the last detected frame; when no cell
+    moved by more than threshold gray levels the cached detections are reused (and still go through
+    the tracker). A full detection is forced after max_skip reused frames in a row.
+    threshold <= 0 disables the cache.
+    """
+    def __init__(self, threshold=None, max_skip=None, thumb_wh=None):
+        self.threshold = threshold if threshold is not None else cfg.detection_cache_threshold
+        self.max_skip = max_skip if max_skip is not None else cfg.detection_cache_max_skip
+        self.thumb_wh = tuple(thumb_wh if thumb_wh is not None else cfg.detection_cache_thumb_wh)
+        self._small = np.empty(self.thumb_wh[::-1] + (3,), dtype=np.uint8)
+        self._thumb = np.empty(self.thumb_wh[::-1], dtype=np.uint8)
+        self._ref = np.empty(self.thumb_wh[::-1], dtype=np.uint8)
+        self._diff = np.empty(self.thumb_wh[::-1], dtype=np.uint8)
+        self._lock = threading.Lock()
+        self.invalidate()
+        self.reset_stats()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def invalidate(self):
+        """forget the cached detections, the next frame is detected"""
+        self.detections = None
+        self._n_reused = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.n_full = 0
+            self.n_reused = 0
+            self.n_forced = 0
+
+    def _thumbnail(self, frame):
+        # every few rows only, still about 4 rows per cell, at a third of the cost of the full frame
+        row_step = max(1, frame.shape[0] // (4 * self.thumb_wh[1]))
+        cv2.resize(frame[::row_step], self.thumb_wh, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._thumb)
+        return self._thumb
+
+    def lookup(self, frame: np.ndarray):
+        """cached detections if frame is close enough to the last detected one, else None"""
+        if not self.enabled:
+            return None
+        thumb = self._thumbnail(frame)
+        if self.detections is None:
+            return None
+        if self._n_reused >= self.max_skip:
+            with self._lock:
+                self.n_forced += 1
+            return None
+        cv2.absdiff(thumb, self._ref, dst=self._diff)
+        if int(self._diff.max()) > self.threshold:
+            return None
+        self._n_reused += 1
+        with self._lock:
+            self.n_reused += 1
+        return self.detections
+
+    def update(self, detections):
+        """detections of a full run on the frame last passed to lookup()"""
+        with self._lock:
+            self.n_full += 1
+        if not self.enabled:
+            return
+        self.detections = detections
+        self._n_reused = 0
+        self._ref, self._thumb = self._thumb, self._ref
+
+    def stats(self):
+        with self._lock:
+            n = self.n_full + self.n_reused
+            return {'n_full': self.n_full, 'n_reused': self.n_reused, 'n_forced': self.n_forced,
+                    'skip_rate': self.n_reused / n if n > 0 else 0.}
+
+    def summary(self, reset=True):
+        """same interface as StageStats.summary, so it can be reported alongside the stages"""
+        s = self.stats()
+        if reset:
+            self.reset_stats()
+        return f"detection_cache: skip={s['skip_rate'] * 100:.1f}% full={s['n_full']} reused={s['n_reused']} forced={s['n_forced']}"
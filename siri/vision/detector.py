@@ -1,10 +1,9 @@
 import os
 import cv2
-import mss
 import time
+import itertools
 import torch
 import threading
-import subprocess
 import numpy as np
 import supervision as sv
 import torchvision.transforms as transforms
@@ -16,80 +15,65 @@ from siri.global_config import GlobalConfig as cfg
 from siri.global_config import GloablStatus
 from siri.vision.preprocess import preprocess, postprocess, pre_transform, pre_transform_crop, to_int, pre_transform_pad, pre_transform_crop_left_right
 from siri.utils.logger import lprint
-from siri.utils.sleeper import Sleeper
+from siri.utils.sleeper import TickScheduler
+from siri.utils.tracer import tracer
+from siri.utils.device import device_policy
+from siri.utils.pipeline import LatestSlot, Stage, StageStats, StatsReporter
+from siri.utils.frame_ring import FrameRing, FrameRef, release_frame
+from siri.vision.capture import CaptureBackend, make_capture_backend
+from siri.vision.engine import make_inference_engine
+from siri.vision.target_selector import TargetSelector, make_target_selector
+from siri.vision.health_bar import HealthBarClassifier
+from siri.vision.roi_stats import RoiColorCheck, RoiColorStats
+from siri.vision.detection_cache import DetectionCache
+from siri.vision.roi_cascade import RoiCascade
+from siri.vision.depth_worker import DepthWorker
+from siri.vision.geometry import WindowGeometryTracker, wmctrl_window_geometry, geometry_to_monitor
 
 
 class ObsMaker:
-    def __init__(self):
-        pass
+    """
+    detections -> obs of the selected target, selection is delegated to a TargetSelector
+    (cfg.target_scorers, nearest to the window center by default)
+    """
+    def __init__(self, selector: TargetSelector=None):
+        self.selector = selector if selector is not None else make_target_selector()
+        self.target_classes = np.array([0, 1], dtype=np.int64)
+        # if cfg.hideout_targets: 5, 6
+        # if not cfg.disable_headshot: 7
+        # if cfg.third_person: 10
 
     def __call__(self, *args, **kwds):
         return self.make_obs(*args, **kwds)
 
-    def make_obs(self, detections):
+    def make_obs(self, detections, mask=None):
+        """
+        detections: sv.Detections, mask (bool, aligned with detections) picks the candidates,
+                    the player / bot classes by default;
+                    or a (xywh, class_id) tuple of arrays / tensors, every row is a candidate
+        """
         if isinstance(detections, sv.Detections):
-            if detections.xyxy.any():
-                boxes_array, classes_tensor = self.convert_sv_to_tensor(detections)
-                if classes_tensor.numel():
-                    target = self.find_best_target(boxes_array, classes_tensor)
-                
-                    clss = [0., 1., 
-                            0 , 1  ]
-                    # if cfg.hideout_targets:
-                    #     clss.extend([5.0, 6.0])
-                    # if not cfg.disable_headshot:
-                    #     clss.append(7.0)
-                    # if cfg.third_person:
-                    #     clss.append(10.0)
-                    
-                    if target.cls in clss:           
-                        x, y = target.x, target.y
-                        # x, y = predict_xy(x, y)
-                        obs = {
-                            'xy': (x, y,),
-                            'cls': target.cls
-                        }
-                        return obs
-
-            return None
+            if len(detections) == 0:
+                return None
+            if mask is None:
+                mask = np.isin(detections.class_id, self.target_classes)
+            selected = self.selector.select(detections.xyxy, detections.class_id, GloablStatus.in_window_center_xy(),
+                                            tracker_id=detections.tracker_id, mask=mask)
+            if selected is None:
+                return None
+            index, xywh = selected
+            return self.target_obs(Target(*xywh, float(detections.class_id[index])))
         elif isinstance(detections, tuple):
-            boxes_array, classes_tensor = detections
-            assert isinstance(boxes_array, torch.Tensor)
-            assert isinstance(classes_tensor, torch.Tensor)
-            target = self.find_best_target(boxes_array, classes_tensor)
-            if target:
-                obs = {
-                    'xy': (target.x, target.y,),
-                    'wh': (target.w, target.h,),
-                    'cls': target.cls
-                }
-                return obs
-            else:
+            boxes_array, classes_array = (x.cpu().numpy() if isinstance(x, torch.Tensor) else np.asarray(x) for x in detections)
+            if len(boxes_array) == 0:
                 return None
+            index, xywh = self.selector.select(self.xywh_to_xyxy(boxes_array), classes_array, GloablStatus.in_window_center_xy())
+            return self.target_obs(Target(*xywh, float(classes_array[index])))
         else:
             assert False, 'WTF?'
-    
-    def find_best_target(self, boxes_array, classes_tensor):
-        return self.find_nearest_target_to(
-            GloablStatus.in_window_center_xy(),
-            boxes_array,
-            classes_tensor
-        )
-    
-    def find_nearest_target_to(self, xy:tuple, boxes_array, classes_tensor,):
-        center = torch.tensor([xy[0], xy[1]], device=cfg.device)
-        distances_sq = torch.sum((boxes_array[:, :2] - center) ** 2, dim=1)
-        # weights = torch.ones_like(distances_sq)
-
-        # head_mask = classes_tensor == 7
-        # if head_mask.any():
-        #     nearest_idx = torch.argmin(distances_sq[head_mask])
-        #     nearest_idx = torch.nonzero(head_mask)[nearest_idx].item()
-        # else:
-        nearest_idx = torch.argmin(distances_sq)
-
-        target_data = boxes_array[nearest_idx, :4].cpu().numpy()
-        target_class = classes_tensor[nearest_idx].item()
+
+    @staticmethod
+    def target_obs(target):
         """
         names:
             0: player
@@ -104,21 +88,18 @@ class ObsMaker:
             9: fire
             10: third_person
         """
-        return Target(*target_data, target_class)
+        return {
+            'xy': (target.x, target.y,),
+            'wh': (target.w, target.h,),
+            'cls': target.cls
+        }
 
     @staticmethod
-    def convert_sv_to_tensor(frame: sv.Detections):
-        assert frame.xyxy.any()
-        xyxy = frame.xyxy
-        xywh = torch.tensor(np.array(
-            [(xyxy[:, 0] + xyxy[:, 2]) / 2,  
-             (xyxy[:, 1] + xyxy[:, 3]) / 2,  
-             xyxy[:, 2] - xyxy[:, 0],        
-             xyxy[:, 3] - xyxy[:, 1]]
-        ), dtype=torch.float32).to(cfg.device).T
-        
-        classes_tensor = torch.from_numpy(np.array(frame.class_id, dtype=np.float32)).to(cfg.device)
-        return xywh, classes_tensor
+    def xywh_to_xyxy(xywh: np.ndarray):
+        xyxy = np.empty(xywh.shape, dtype=np.float32)
+        xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:4] / 2
+        xyxy[:, 2:4] = xywh[:, :2] + xywh[:, 2:4] / 2
+        return xyxy
 
 
 class Target:
@@ -130,10 +111,16 @@ class Target:
         self.cls = cls
 
 class FakeDeepPredictor:
+    def __init__(self):
+        self._deep_frame = None
+
     def predict(self, frame_or_batch: Union[np.ndarray, List[np.ndarray]]):
         deep_obs = {'f': 0, 'l': 0, 'r': 0}
         deep_frame_shape = frame_or_batch[0].shape[:2]
-        return deep_obs, (np.ones(deep_frame_shape, dtype=np.float32) * 100)
+        if self._deep_frame is None or self._deep_frame.shape != deep_frame_shape:
+            # constant and read-only for consumers, allocate once
+            self._deep_frame = np.full(deep_frame_shape, 100, dtype=np.float32)
+        return deep_obs, self._deep_frame
 class DeepPredictor:
     def __init__(self):
         # 加载 MiDaS 模型
@@ -145,16 +132,14 @@ class DeepPredictor:
         # self.model = torch.hub.load('./MiDaS', model_type, source='local', pretrained=False)
         # self.model.load_state_dict(torch.load(local_model_path))
 
-        from siri.vision.midas import swin_256, dpt_hybrid_384, midas_small_256, swin_l_384
-        # self.model, self.transform, self.model_sz = swin_256()
-        # self.model, self.transform, self.model_sz = dpt_hybrid_384()
-        self.model, self.transform, self.model_sz = midas_small_256()
-        # self.model, self.transform, self.model_sz = swin_l_384()
+        # swin_256, dpt_hybrid_384, midas_small_256, swin_l_384, shared through the zoo (on device, eval)
+        from siri.vision.midas import depth_zoo
+        entry = depth_zoo.get(cfg.depth_model, variant=cfg.depth_variant)
+        self.model, self.transform, self.model_sz, self.batch_transform = entry
+        self.dtype = entry.dtype
+        assert self.transform is not None or cfg.depth_batch_transform, "a cached traced depth model needs cfg.depth_batch_transform"
 
-
-        self.device = cfg.device
-        self.model.to(self.device)
-        self.model.eval()
+        self.device = device_policy.device
         
 
     def _predict(self, frame_or_batch: Union[np.ndarray, List[np.ndarray]]):
@@ -168,6 +153,13 @@ class DeepPredictor:
 
         assert len(batch[0].shape) == 3
 
+        if cfg.depth_batch_transform:
+            input_tensor = self.batch_transform(batch)
+            with torch.no_grad():
+                prediction = self.model(input_tensor)
+            # one device -> host copy for the batch
+            return list(prediction.reshape(len(batch), *prediction.shape[-2:]).cpu().numpy())
+
         # 仅使用 pre_transform 进行大小变换
         # batch = pre_transform(batch, self.model_sz)
         batch = pre_transform_crop_left_right(batch, 0.3)
@@ -177,7 +169,7 @@ class DeepPredictor:
         depth_maps = []
         for frame in batch:
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            input_tensor = self.transform(frame).to(self.device)
+            input_tensor = self.transform(frame).to(self.device, dtype=self.dtype)
 
             with torch.no_grad():
                 prediction = self.model(input_tensor)
@@ -210,82 +202,75 @@ class DeepPredictor:
         
     #     return self._process_depth_frame_common(deep_frame)
 
-    def process_depth_frame(self, deep_frame: np.ndarray):
+    # 采样区域参数
+    num_regions = 7  # 检测框
+    circula_coef = 5
+
+    def depth_regions(self, shape):
+        """
+        检测框 (x_start, y_start, x_end, y_end) 以及它们在展平深度图中的下标 (num_regions, h * w),
+        每种深度图尺寸只计算一次
+        """
+        if getattr(self, '_regions', None) is None or self._regions[0] != shape:
+            dp_h, dp_w = shape
+            center_y = dp_h // 2
+            margin_x = 0  # 两侧的空隙
+            shift_y = dp_h // 15  # 可调高度
+            region_width = (dp_w - 2 * margin_x) // self.num_regions  # 每个区域的宽度
+            region_height = dp_h // 12  # 采样区域的高度
+            rects = []
+            for i in range(self.num_regions):
+                x_start = margin_x + i * region_width
+                y_start = center_y - region_height // 2 + shift_y + int(abs(i + 1 - (self.num_regions + 1) / 2) * self.circula_coef)
+                rects.append((x_start, y_start, x_start + region_width, y_start + region_height // 2 * 2))
+            rects = np.array(rects)
+            ys = rects[:, 1:2, None] + np.arange(rects[0, 3] - rects[0, 1])[None, :, None]
+            xs = rects[:, 0:1, None] + np.arange(region_width)[None, None, :]
+            index = (ys * dp_w + xs).reshape(self.num_regions, -1)
+            self._regions = (shape, rects, index)
+        return self._regions[1:]
+
+    def process_depth_frame(self, deep_frame: np.ndarray, render=None):
         """
         使用 Z-score 标准化处理 MiDaS 深度图，决定智能体的移动方向。
         :param deep_frame: MiDaS 输出的深度图 (numpy float 数组，正方形)
-        :return: 深度信息字典和带标记的深度图
+        :param render: 是否在深度图上画检测框 (render_depth_frame), 默认 cfg.depth_render
+        :return: 深度信息字典和 (带标记的) 深度图
         """
-        min_ = np.min(deep_frame)
-        max_ = np.max(deep_frame)
-        mean = np.mean(deep_frame)
+        rects, index = self.depth_regions(deep_frame.shape)
+        # 各区域的平均深度, 一次 gather + reduce
+        depth_values = np.ravel(deep_frame)[index].mean(axis=1)
+        min_index = int(np.argmin(depth_values))
         std = np.std(deep_frame)
-        deep_frame_z = (deep_frame.copy() - mean) / (std + 1e-6)  # 避免除零
-        
-        dp_h, dp_w = deep_frame.shape
-        center_x = dp_w // 2
-        center_y = dp_h // 2
-        
-        # 采样区域参数
-        num_regions = 7  # 检测框
-        margin_x = 0  # 两侧的空隙
-        shift_y = dp_h // 15  # 可调高度
-        region_width = (dp_w - 2 * margin_x) // num_regions  # 每个区域的宽度
-        region_height = dp_h // 12  # 采样区域的高度
-        circula_coef = 5
-        
-        depth_values = []
+
         deep_obs = {'f': 0, 'l': 0, 'r': 0}
-        
-        for i in range(num_regions):
-            x_start = margin_x + i * region_width
-            x_end = x_start + region_width
-            y_start = center_y - region_height // 2 + shift_y + int(abs(i + 1 - (num_regions+1)/2) * circula_coef)
-            y_end = center_y + region_height // 2 + shift_y + int(abs(i + 1 - (num_regions+1)/2) * circula_coef)
-            
-            # 计算区域深度
-            region_depth_z = deep_frame_z[y_start:y_end, x_start:x_end]
-            region_depth = deep_frame[y_start:y_end, x_start:x_end]
-            avg_depth = np.mean(region_depth)
-            depth_values.append(avg_depth)
-            
-            # 画检测框
-            deep_frame = cv2.rectangle(deep_frame, (x_start, y_start), (x_end, y_end), 0.5, thickness=3)
-            deep_frame = cv2.putText(deep_frame, str(int(avg_depth)), 
-                                    (x_start, y_start - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, float(max_), thickness=1)
-        
-        # 计算深度信息
-        min_depth = min(depth_values)
-        min_index = depth_values.index(min_depth)
-
-
-        x_start = margin_x + min_index * region_width
-        x_end = x_start + region_width
-        y_start = center_y - region_height // 2 + shift_y + int(abs(min_index + 1 - (num_regions+1)/2) * circula_coef)
-        y_end = center_y + region_height // 2 + shift_y + int(abs(min_index + 1 - (num_regions+1)/2) * circula_coef)
-        deep_frame = cv2.rectangle(deep_frame, (x_start, y_start), (x_end, y_end), float(max_), thickness=-1)
-
-        depth_values = np.array(depth_values)  # 转换为 numpy 数组
-        # # 先去掉最高值和最低值
-        # if len(depth_values) > 2:  # 确保至少有 3 个数值，否则无法去掉
-        #     depth_values = np.delete(depth_values, [np.argmax(depth_values), np.argmin(depth_values)])
-        # else:
-        #     depth_values = depth_values  # 如果元素过少，直接使用原数据
-        depth_std = np.std(depth_values)
-        
         if std > 100:
             min_num = min_index + 1
-            if min_num < (num_regions + 1)/2:
+            if min_num < (self.num_regions + 1)/2:
                 deep_obs['l'] = 1
-            elif min_num > (num_regions+1)/2:
+            elif min_num > (self.num_regions+1)/2:
                 deep_obs['r'] = 1
             else:
                 deep_obs['f'] = 1
         else:
             deep_obs['r'] = 1
-        
+
+        if render if render is not None else cfg.depth_render:
+            deep_frame = self.render_depth_frame(deep_frame, rects, depth_values, min_index)
         return deep_obs, deep_frame
 
+    @staticmethod
+    def render_depth_frame(deep_frame, rects, depth_values, min_index):
+        """画检测框和各区域深度, 最近的区域填充, 只用于显示"""
+        max_ = float(np.max(deep_frame))
+        for (x_start, y_start, x_end, y_end), avg_depth in zip(rects.tolist(), depth_values.tolist()):
+            deep_frame = cv2.rectangle(deep_frame, (x_start, y_start), (x_end, y_end), 0.5, thickness=3)
+            deep_frame = cv2.putText(deep_frame, str(int(avg_depth)),
+                                    (x_start, y_start - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, max_, thickness=1)
+        x_start, y_start, x_end, y_end = rects[min_index].tolist()
+        deep_frame = cv2.rectangle(deep_frame, (x_start, y_start), (x_end, y_end), max_, thickness=-1)
+        return deep_frame
+
 
 class Detector(threading.Thread):
     def __init__(self, model, obs_hook=None, sv_source_hook=None):
@@ -293,9 +278,23 @@ class Detector(threading.Thread):
         from ultralytics import YOLO
         assert isinstance(model, YOLO)
         self.model = model
+        self.engine = make_inference_engine(model)
         # self.deep_model = DeepPredictor()
         self.deep_model = FakeDeepPredictor()
+        # a real depth model runs in its own thread at cfg.depth_interval, infer() takes its latest output
+        self.depth_worker = None
+        if cfg.depth_async and not isinstance(self.deep_model, FakeDeepPredictor):
+            self.depth_worker = DepthWorker(self.deep_model, fallback=FakeDeepPredictor())
         self.tracker = sv.ByteTrack()
+        # reuses the last detections on near identical frames
+        self.det_cache = DetectionCache()
+        self.session_stats = [self.det_cache]
+        # crops around tracked targets between full frame scans
+        self.cascade = RoiCascade(model) if cfg.cascade else None
+        if self.cascade is not None:
+            self.session_stats.append(self.cascade)
+        if self.depth_worker is not None:
+            self.session_stats.append(self.depth_worker.stats)
         self.make_obs = ObsMaker()
         # self.feature_detector = HealthBarFeatureDetector(
         #     # enemy_template_path="enemy_bar.png",
@@ -310,6 +309,7 @@ class Detector(threading.Thread):
         self.upper_enemy = np.clip(np.array([98, 93, 238]) + 30, 0, 255)
         self.lower_friendly = np.array([0, 0, 240])  
         self.upper_friendly = np.array([180, 30, 255])  
+        self.health_bar = HealthBarClassifier(self.lower_enemy, self.upper_enemy, self.lower_friendly, self.upper_friendly)
 
 
         self.scope_bt_x, self.scope_bt_y = (94, 94,)
@@ -317,9 +317,15 @@ class Detector(threading.Thread):
         self.scope_bt_color_lb = np.clip(np.array([38, 35, 149]) - 20, 0, 255)
         self.scope_bt_color_ub = np.clip(np.array([78, 73, 188]) + 20, 0, 255)
         self.scope_bt_color_mean = np.mean([self.scope_bt_color_lb, self.scope_bt_color_ub], axis=0)
+        # fixed HUD checks, one inRange + countNonZero each per frame
+        self.hud = RoiColorStats([
+            RoiColorCheck.around('scope', self.scope_bt_x, self.scope_bt_y, self.scope_bt_r,
+                                 self.scope_bt_color_lb, self.scope_bt_color_ub, 10000, step=cfg.hud_sample_step),  # about 15000 at usual
+        ])
 
         self.obs_hook = obs_hook
         self.sv_source_hook = sv_source_hook
+        self._seq = itertools.count()
 
 
 
@@ -348,30 +354,8 @@ class Detector(threading.Thread):
         if cfg.manual_preprocess: 
             batch = preprocess(batch)
 
-        results = self.model.predict(
-            batch,
-            cfg=f"{cfg.root_dir}/siri/vision/game.yaml",
-            imgsz=tuple(reversed(cfg.sz_wh)),
-            stream=True,
-            conf=cfg.conf_threshold,
-            iou=0.5,
-            device=cfg.device,
-            half=cfg.half,
-            max_det=20,
-            agnostic_nms=False,
-            augment=False,
-            vid_stride=False,
-            visualize=False,
-            verbose=False,
-            show_boxes=False,
-            show_labels=False,
-            show_conf=False,
-            save=False,
-            show=False,
-            # batch=1
-        )
-
-        return results
+        # one Results per frame, see InferenceEngine for the predict kwargs
+        return self.engine(batch)
 
     def detect_health_bar(self, frame, bbox):
         x1, y1, x2, y2 = bbox
@@ -449,17 +433,6 @@ class Detector(threading.Thread):
  
 
     
-    def circle_detect_(self, frame, x, y, r, lb, ub, thresh, visual_color=None):
-        roi = frame[max(0, y-r):y+r, max(0, x-r):x+r]
-        assert not roi.size == 0
-        mask = cv2.inRange(roi, lb, ub)
-        pixels = cv2.countNonZero(mask)
-        in_ = False
-        if pixels > thresh:  # about 15000 at usual
-            in_ = True
-        if visual_color is not None: frame = cv2.circle(frame, (x, y,), r, visual_color, thickness=7)
-        return in_, frame
-        
 
     # def predict_and_plot(self, frame):
     #     results = self._predict(frame)
@@ -476,128 +449,308 @@ class Detector(threading.Thread):
 
     
     def predict_and_make_obs(self, frame):
-        frame_original = frame.copy()
-        results = self._predict(frame)
-        # frame = frame.copy()
-        # print(results)
-        if isinstance(results, list):
-            if len(results) > 0:
-                result = results[0]
-            else:
-                lprint(self, "no result were returned by the model")
-                return
-        else:
-            try:
-                result = next(results)
-            except StopIteration:
+        packet = self.infer(frame)
+        if packet is not None:
+            self.publish(packet)
+
+    def infer(self, frame: Union[np.ndarray, FrameRef]):
+        """
+        frame may be a FrameRef from the grabber's ring, it is shared (not copied) with
+        obs and sv_source, each of which holds its own reference
+        """
+        frame_ref = None
+        if isinstance(frame, FrameRef):
+            frame_ref = frame
+            frame = frame_ref.array
+        frame_original = frame
+        # pairs obs / act with sv_source downstream, see visualizer.FrameActJoin
+        seq = frame_ref.seq if frame_ref is not None else next(self._seq)
+        t_grab = frame_ref.t_grab if frame_ref is not None else time.monotonic()
+        with tracer.span('detection_cache'):
+            detections = self.det_cache.lookup(frame)
+        if detections is None and self.cascade is not None:
+            with tracer.span('yolo_roi'):
+                detections = self.cascade.detect(frame)
+            if detections is not None:
+                self.det_cache.update(detections)
+        if detections is None:
+            with tracer.span('yolo_predict'):
+                results = self._predict(frame)
+                # frame = frame.copy()
+                # print(results)
+                result = results[0] if len(results) > 0 else None
+            if result is None:
                 lprint(self, "no result were returned by the model")
-                return
+                return None
+            detections = sv.Detections.from_ultralytics(result)
+            self.det_cache.update(detections)
     
-        deep_obs, deep_frame = self.deep_model.predict(frame)
+        with tracer.span('depth'):
+            if self.depth_worker is not None:
+                self.depth_worker.submit(frame if frame_ref is None else frame_ref)
+                deep_obs, deep_frame, t_depth = self.depth_worker.latest(frame)
+            else:
+                deep_obs, deep_frame = self.deep_model.predict(frame)
+                t_depth = t_grab
+        if cfg.yolo_plt:
+            # debug drawings go into a private copy, the shared frame stays untouched
+            frame = frame.copy()
 
         
-        sv_detections = sv.Detections.from_ultralytics(result)
-        sv_detections = self.tracker.update_with_detections(sv_detections)
-
-        enemy_boxes = []
-        classes_tensor = []
-        annotated = False
-        for i, (x1, y1, x2, y2) in enumerate(sv_detections.xyxy):
-            if sv_detections.class_id[i] == 0:
-                is_enm, frame = self.detect_health_bar(frame, (x1, y1, x2, y2,))
-                if is_enm:
-                    enemy_boxes.append(to_int([(x1 + x2)/2, (y1 + y2)/2, x2-x1, y2-y1]))  # x_center, y_center, w, h
-                    classes_tensor.append(sv_detections.class_id[i])
-                annotated = True
-            elif sv_detections.class_id[i] == 7:
-                pass
+        with tracer.span('tracking'):
+            sv_detections = self.tracker.update_with_detections(detections)
+            if self.cascade is not None:
+                self.cascade.observe(sv_detections, frame.shape)
+
+        # aligned with sv_detections, players that carry an enemy health bar
+        player_mask = sv_detections.class_id == 0
+        annotated = bool(player_mask.any())
+        with tracer.span('health_bar'):
+            if cfg.yolo_plt:
+                # per box, with the debug drawings
+                enemy_mask = np.zeros(len(sv_detections), dtype=bool)
+                for i in np.flatnonzero(player_mask):
+                    enemy_mask[i], frame = self.detect_health_bar(frame, sv_detections.xyxy[i])
+            else:
+                enemy_mask = self.health_bar.classify(frame, sv_detections.xyxy, player_mask)
         
 
-        
-        in_scope, frame = self.circle_detect_(frame, self.scope_bt_x, self.scope_bt_y, self.scope_bt_r, self.scope_bt_color_lb, self.scope_bt_color_ub, 10000, visual_color=self.scope_bt_color_mean)
+        with tracer.span('scope'):
+            in_scope = self.hud.check('scope', frame)
+            if cfg.yolo_plt:
+                frame = cv2.circle(frame, (self.scope_bt_x, self.scope_bt_y,), self.scope_bt_r, self.scope_bt_color_mean, thickness=7)
         
 
         obs = {
+            'seq': seq,
+            't_grab': t_grab,
             'in_scope': in_scope,
-            'frame': frame_original.copy(),
-            'deep_frame': deep_frame.copy()
+            'frame': frame_original,
+            'frame_ref': None if frame_ref is None else frame_ref.retain(),
+            'deep_frame': deep_frame,
+            # grab time of the frame deep_frame / f, l, r come from, None until the first depth result
+            'deep_t': t_depth,
         }
         obs.update(deep_obs)
-        if len(enemy_boxes) > 0:
-            boxes_tensor = torch.tensor(enemy_boxes, dtype=torch.float32, device=cfg.device)
-            classes_tensor = torch.tensor(classes_tensor, dtype=torch.float32, device=cfg.device)
-            obs.update(self.make_obs((boxes_tensor, classes_tensor,)))
-
+        if enemy_mask.any():
+            with tracer.span('obs_maker'):
+                obs.update(self.make_obs(sv_detections, mask=enemy_mask))
+
+        sv_source = {'seq': seq,
+                     'frame': frame,
+                     'frame_ref': None if (frame_ref is None or frame is not frame_original) else frame_ref.retain(),
+                    #  'deep_frame': deep_frame.copy(),
+                     'deep_frame': None,
+                     'detections': None if annotated else sv_detections,
+                     # drawn by the visualizer on its own canvas, see Visualizer.plot
+                     'scope_circle': None if cfg.yolo_plt else ((self.scope_bt_x, self.scope_bt_y,), self.scope_bt_r, self.scope_bt_color_mean)}
+        return {'obs': obs, 'sv_source': sv_source}
+
+    def discard(self, packet: dict):
+        release_frame(packet['obs'])
+        release_frame(packet['sv_source'])
+
+    def publish(self, packet: dict):
+        # a side without a consumer gives its frame reference back to the ring right away
         if self.obs_hook is not None:
-            self.obs_hook(obs)
-            
+            self.obs_hook(packet['obs'])
+        else:
+            release_frame(packet['obs'])
 
         if self.sv_source_hook is not None:
-            self.sv_source_hook({'frame': frame.copy(),
-                                #  'deep_frame': deep_frame.copy(),
-                                 'deep_frame': None,
-                                 'detections': None if annotated else sv_detections})
+            self.sv_source_hook(packet['sv_source'])
+        else:
+            release_frame(packet['sv_source'])
+
+    def close(self):
+        """stops and joins the depth worker, an unstarted one (same stats) is left for the next session"""
+        if self.depth_worker is not None:
+            self.depth_worker.stop()
+            stats = self.depth_worker.stats
+            self.depth_worker = DepthWorker(self.deep_model, fallback=FakeDeepPredictor())
+            self.depth_worker.stats = stats
 
 
 
 
 
 class ScrGrabber():
+    # injectable, e.g. FakeGeometryTracker for headless runs; a WindowGeometryTracker is created when None
+    geometry_tracker = None
+    # extra objects with a StageStats-like summary(reset), reported with the pipeline stages
+    session_stats = ()
+
     @staticmethod
     def get_scrcpy_window_geometry(window_keyword='Phone'):
-        result = subprocess.run(
-            ['wmctrl', '-lG'],
-            stdout=subprocess.PIPE,
-            text=True
-        )
-        lines = result.stdout.splitlines()
-        for line in lines:
-            if window_keyword in line:
-                parts = line.split()
-                x, y = int(parts[2]), int(parts[3])
-                scr_width, scr_height = int(parts[4]), int(parts[5])
-                return x, y, scr_width, scr_height
-        return None
-
-    def start_session(self, func, *args, **kwargs):
-        geometry = self.get_scrcpy_window_geometry()
+        return wmctrl_window_geometry(window_keyword)
+
+    def open_monitor(self, geometry=None):
+        """
+        set GloablStatus.monitor from geometry, or from the geometry tracker which then keeps
+        following the window until close_monitor()
+        """
+        self._tracking = False
+        if geometry is None:
+            if self.geometry_tracker is None:
+                self.geometry_tracker = WindowGeometryTracker()
+            elif getattr(self.geometry_tracker, 'ident', None) is not None:
+                # tracked a previous session, re-locate the window with a new thread
+                self.geometry_tracker = self.geometry_tracker.fresh()
+            geometry = self.geometry_tracker.geometry()
+            self._tracking = geometry is not None
+            if not self._tracking:
+                self.geometry_tracker.stop()
         if not geometry:
             lprint(self, "scrcpy window not found")
-            lprint(self, "start_session failed")
-            return
+            return False
 
         assert GloablStatus.monitor is None
-        left, top, scr_width, scr_height = geometry
+        GloablStatus.monitor = geometry_to_monitor(geometry)
+        return True
 
-        GloablStatus.monitor = {
-            "top": top,
-            "left": left,
-            "width": scr_width,
-            "height": scr_height,
-        }
+    def close_monitor(self):
+        if getattr(self, '_tracking', False):
+            self.geometry_tracker.stop()
+        GloablStatus.monitor = None
+
+    def close(self):
+        """called when a session ends, after its stages are joined; stops the helper threads of func"""
+        pass
+
+    def grab_ref(self, backend: CaptureBackend) -> FrameRef:
+        ref = self.frame_ring.acquire()
+        ref.t_grab = time.monotonic()
+        with tracer.span('capture'):
+            backend.grab(GloablStatus.monitor, out=ref.array)
+        return ref
+
+    def start_session(self, func, *args, consumer=None, discard=None, backend: CaptureBackend=None, **kwargs):
+        """
+        func: inference stage, called with a FrameRef of the latest grabbed frame,
+              it must retain() the ref if anything returned keeps the frame
+        consumer: optional consumer stage, called in its own thread with func's return value
+        discard: called with func's return values that are dropped before reaching consumer
+        backend: capture backend, cfg.capture_backend by default
+        """
+        if backend is None:
+            backend = make_capture_backend()
+        self.capture_backend = backend
+
+        if not self.open_monitor(backend.geometry()):
+            lprint(self, "start_session failed")
+            return
+
+        self.frame_ring = FrameRing(tuple(reversed(cfg.sz_wh)) + (3,), n_slots=cfg.frame_ring_size)
+        self.tick_scheduler = TickScheduler(tick=cfg.tick, user=self, stop_event=GloablStatus.stop_event)
 
         try:
-            with mss.mss() as sct:
-                while True:
-                    sleeper = Sleeper(tick=cfg.tick, user=self)
-                    screenshot = sct.grab(GloablStatus.monitor)
-                    frame = np.array(screenshot)
-                    if frame.shape[-1] == 4:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                    assert frame.shape[-1] == 3, 'not a BGR format'
-                    frame = cv2.resize(frame, cfg.sz_wh)
-
-                    func(frame, *args, **kwargs)
-
-                    sleeper.sleep()
+            if cfg.pipeline:
+                self._run_pipeline(func, consumer, discard, *args, **kwargs)
+            else:
+                with backend:
+                    self.tick_scheduler.reset()
+                    while not GloablStatus.stop_event.is_set():
+                        frame_ref = self.grab_ref(backend)
+
+                        result = func(frame_ref, *args, **kwargs)
+                        frame_ref.release()
+                        if consumer is not None and result is not None:
+                            consumer(result)
+                        tracer.maybe_report()
+
+                        self.tick_scheduler.sleep()
         except KeyboardInterrupt:
             lprint(self, "Sig INT catched, stopping session.")
+        except EOFError:
+            lprint(self, "capture source exhausted, stopping session.")
         finally:
             # cv2.destroyAllWindows()
-            GloablStatus.monitor = None
+            self.close_monitor()
+            self.close()
             GloablStatus.stop_event.set()
+            if tracer.enabled and cfg.trace_chrome_file is not None:
+                tracer.dump_chrome_trace(cfg.trace_chrome_file)
+
+    def _grab_loop(self, capture_slot: LatestSlot, stats: StageStats):
+        try:
+            with self.capture_backend as backend:
+                self.tick_scheduler.reset()
+                while not GloablStatus.stop_event.is_set():
+                    frame_ref = self.grab_ref(backend)
+                    t_grab = frame_ref.t_grab
+                    stats.record(time.monotonic() - t_grab)
+                    dropped = capture_slot.put((t_grab, frame_ref))
+                    if dropped is not None:
+                        dropped[1].release()
+                    self.tick_scheduler.sleep()
+        except EOFError:
+            lprint(self, "capture source exhausted, stopping session.")
+            GloablStatus.stop_event.set()
+        except Exception as e:
+            lprint(self, f"Error: capture stage crashed, {e!r}")
+            GloablStatus.stop_event.set()
+            raise
+        finally:
+            capture_slot.close()
+
+    def _run_pipeline(self, func, consumer, discard, *args, **kwargs):
+        # capture thread -> [capture_slot] -> inference (this thread) -> [result_slot] -> consumer thread
+        capture_slot = LatestSlot('capture')
+        capture_stats = StageStats('capture')
+        infer_stats = StageStats('inference')
+        reporter = StatsReporter([capture_stats, infer_stats, self.tick_scheduler] + list(self.session_stats))
+        reporter.add_slot(capture_slot)
+
+        capture_thread = threading.Thread(target=self._grab_loop, args=(capture_slot, capture_stats), name='capture', daemon=True)
+        consumer_stage = None
+        if consumer is not None:
+            result_slot = LatestSlot('result')
+            consumer_stage = Stage('consumer', consumer, in_slot=result_slot, on_drop=discard)
+            reporter.stats_list.append(consumer_stage.stats)
+            reporter.add_slot(result_slot)
+            consumer_stage.start()
+        capture_thread.start()
+
+        try:
+            while not GloablStatus.stop_event.is_set() and not capture_slot.closed:
+                packet = capture_slot.get(timeout=3 * cfg.tick)
+                if packet is None:
+                    continue
+                t_grab, frame_ref = packet
+
+                t0 = time.monotonic()
+                try:
+                    result = func(frame_ref, *args, **kwargs)
+                finally:
+                    frame_ref.release()
+                t1 = time.monotonic()
+                infer_stats.record(t1 - t0, age=t1 - t_grab)
+
+                if consumer_stage is not None and result is not None:
+                    dropped = result_slot.put((t_grab, result))
+                    if dropped is not None and discard is not None:
+                        discard(dropped[1])
+                reporter.maybe_report()
+                tracer.maybe_report()
+        finally:
+            GloablStatus.stop_event.set()
+            capture_slot.close()
+            if consumer_stage is not None:
+                result_slot.close()
+                consumer_stage.join(timeout=1.)
+            capture_thread.join(timeout=1.)
+            # packets still waiting in the slots hold frame references
+            packet = capture_slot.get(timeout=0)
+            if packet is not None:
+                packet[1].release()
+            if consumer_stage is not None:
+                packet = result_slot.get(timeout=0)
+                if packet is not None and discard is not None:
+                    discard(packet[1])
     
-    def save_frame(self, frame: np.ndarray):
+    def save_frame(self, frame: Union[np.ndarray, FrameRef]):
+        if isinstance(frame, FrameRef):
+            frame = frame.array
         assert isinstance(frame, np.ndarray)
 
         save_dir = f"{cfg.root_dir}/{self.__class__.__name__}"
@@ -613,5 +766,8 @@ class ScrGrabber():
 
 class ScrDetector(Detector, ScrGrabber):
     def start_session(self):
-        ScrGrabber.start_session(self, func=self.predict_and_make_obs)
+        if cfg.pipeline:
+            ScrGrabber.start_session(self, func=self.infer, consumer=self.publish, discard=self.discard)
+        else:
+            ScrGrabber.start_session(self, func=self.predict_and_make_obs)
 
@@ -0,0 +1,136 @@
+import torch
+import numpy as np
+from typing import Union, List
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+from siri.utils.device import device_policy
+
+
+def default_predict_kwargs():
+    return dict(
+        cfg=f"{cfg.root_dir}/siri/vision/game.yaml",
+        imgsz=tuple(reversed(cfg.sz_wh)),
+        conf=cfg.conf_threshold,
+        iou=0.5,
+        device=str(device_policy.device),
+        half=device_policy.half,
+        max_det=20,
+        agnostic_nms=False,
+        augment=False,
+        vid_stride=1,
+        visualize=False,
+        verbose=False,
+        show_boxes=False,
+        show_labels=False,
+        show_conf=False,
+        save=False,
+        show=False,
+    )
+
+
+class InferenceEngine:
+    """
+    Wraps a YOLO model whose predictor is set up once, predict() takes one frame or a micro-batch and
+    returns one Results per frame.
+
+    Batches of uint8 BGR frames shaped like frame_wh (cfg.sz_wh by default) take the fast path: preprocess -> inference ->
+    postprocess on the already configured predictor, skipping the per call cfg merge, source loader
+    and stream generator of model.predict(). Anything else (other shapes, tensors) goes through
+    model.predict() with the same prebuilt kwargs.
+    """
+    def __init__(self, model, batch_size=None, fast_path=None, frame_wh=None, **overrides):
+        from ultralytics import YOLO
+        assert isinstance(model, YOLO)
+        self.model = model
+        self.batch_size = batch_size if batch_size is not None else cfg.predict_batch_size
+        self.fast_path = fast_path if fast_path is not None else cfg.predict_fast_path
+        frame_wh = tuple(frame_wh) if frame_wh is not None else tuple(cfg.sz_wh)
+        self.predict_kwargs = default_predict_kwargs()
+        self.predict_kwargs['imgsz'] = tuple(reversed(frame_wh))
+        self.predict_kwargs.update(overrides)
+        self.frame_shape = tuple(reversed(frame_wh)) + (3,)
+        self._predictor = None
+        self.n_fast = 0
+        self.n_slow = 0
+
+    def warmup(self):
+        """sets up the predictor (device, half, imgsz checks) with a blank frame"""
+        if self._predictor is not None:
+            return
+        blank = np.zeros(self.frame_shape, dtype=np.uint8)
+        # a predictor of our own, several engines (other imgsz) may share the model
+        self.model.predictor = None
+        self.model.predict([blank], stream=False, **self.predict_kwargs)
+        self._predictor = self.model.predictor
+        lprint(self, f"predictor ready, imgsz={self._predictor.imgsz} device={self._predictor.device} fast_path={self.fast_path}")
+
+    def _is_fixed_shape(self, batch):
+        for frame in batch:
+            if not isinstance(frame, np.ndarray) or frame.shape != self.frame_shape or frame.dtype != np.uint8:
+                return False
+        return True
+
+    def _predict_fast(self, batch: List[np.ndarray]):
+        p = self._predictor
+        # construct_results reads the image paths from predictor.batch
+        p.batch = ([f"image{i}.jpg" for i in range(len(batch))], batch, [''] * len(batch))
+        with torch.inference_mode():
+            im = p.preprocess(batch)
+            preds = p.inference(im)
+            results = p.postprocess(preds, im, batch)
+        self.n_fast += len(batch)
+        return results
+
+    def _predict_slow(self, batch):
+        self.n_slow += len(batch)
+        self.model.predictor = self._predictor
+        return list(self.model.predict(batch, stream=False, **self.predict_kwargs))
+
+    def predict(self, frame_or_batch: Union[np.ndarray, List[np.ndarray], torch.Tensor]):
+        if isinstance(frame_or_batch, np.ndarray):
+            batch = [frame_or_batch]
+        elif isinstance(frame_or_batch, (list, tuple)):
+            batch = list(frame_or_batch)
+        elif isinstance(frame_or_batch, torch.Tensor):
+            # already preprocessed (cfg.manual_preprocess), ultralytics takes care of it
+            self.warmup()
+            return self._predict_slow(frame_or_batch)
+        else:
+            assert False
+        if len(batch) == 0:
+            return []
+        assert len(batch[0].shape) == 3
+
+        self.warmup()
+        if not (self.fast_path and self._is_fixed_shape(batch)):
+            return self._predict_slow(batch)
+
+        results = []
+        for i in range(0, len(batch), self.batch_size):
+            results.extend(self._predict_fast(batch[i:i + self.batch_size]))
+        return results
+
+    __call__ = predict
+
+    def predict_iter(self, frames):
+        """
+        for offline labeling / replay: yields (frame, result), grouping frames into micro-batches,
+        a frame must stay untouched until it is yielded back
+        """
+        pending = []
+        for frame in frames:
+            pending.append(frame)
+            if len(pending) == self.batch_size:
+                yield from zip(pending, self.predict(pending))
+                pending = []
+        if len(pending) > 0:
+            yield from zip(pending, self.predict(pending))
+
+
+def make_inference_engine(model, backend=None, **kwargs):
+    backend = backend if backend is not None else cfg.detector_backend
+    if backend == 'torch':
+        return InferenceEngine(model, **kwargs)
+    from siri.vision.onnx_engine import OnnxInferenceEngine
+    return OnnxInferenceEngine(model, runtime=backend, **kwargs)
@@ -0,0 +1,182 @@
+import select
+import threading
+import subprocess
+
+from siri.utils.logger import lprint
+from siri.global_config import GloablStatus
+from siri.global_config import GlobalConfig as cfg
+
+
+def geometry_to_monitor(geometry):
+    left, top, width, height = geometry
+    return {
+        "top": top,
+        "left": left,
+        "width": width,
+        "height": height,
+    }
+
+
+def wmctrl_window_geometry(window_keyword='Phone'):
+    result = subprocess.run(
+        ['wmctrl', '-lG'],
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    lines = result.stdout.splitlines()
+    for line in lines:
+        if window_keyword in line:
+            parts = line.split()
+            x, y = int(parts[2]), int(parts[3])
+            scr_width, scr_height = int(parts[4]), int(parts[5])
+            return x, y, scr_width, scr_height
+    return None
+
+
+class WindowGeometryTracker(threading.Thread):
+    """
+    Caches the scrcpy window rect and keeps GloablStatus.monitor up to date in the background.
+    With python-xlib it finds the window without spawning wmctrl and wakes up on ConfigureNotify,
+    re-checking every poll_interval anyway; without Xlib it polls wmctrl at poll_interval.
+    python-xlib is not thread safe: the display connection is opened, used and closed by the
+    tracker thread only, other threads read the geometry it publishes under _lock.
+    """
+    def __init__(self, window_keyword='Phone', poll_interval=None, locate_timeout=2.):
+        super().__init__(daemon=True)
+        self.window_keyword = window_keyword
+        self.poll_interval = poll_interval if poll_interval is not None else cfg.geometry_poll_interval
+        self.locate_timeout = locate_timeout
+        self._geometry = None
+        self._lock = threading.Lock()
+        self._located = threading.Event()
+        self._stop_event = threading.Event()
+        self._display = None
+        self._window = None
+        self.n_updates = 0
+
+    def _open_display(self):
+        try:
+            from Xlib import display as xdisplay
+            self._display = xdisplay.Display()
+        except Exception as e:
+            lprint(self, f"python-xlib unavailable ({e!r}), falling back to wmctrl polling")
+
+    def _find_window(self, window):
+        name = window.get_wm_name()
+        if isinstance(name, bytes):
+            name = name.decode(errors='ignore')
+        if name and self.window_keyword in name:
+            return window
+        for child in window.query_tree().children:
+            found = self._find_window(child)
+            if found is not None:
+                return found
+        return None
+
+    def _xlib_geometry(self):
+        from Xlib import X, error
+        root = self._display.screen().root
+        try:
+            if self._window is None:
+                self._window = self._find_window(root)
+                if self._window is None:
+                    return None
+                self._window.change_attributes(event_mask=X.StructureNotifyMask)
+                self._display.flush()
+            g = self._window.get_geometry()
+            pos = root.translate_coords(self._window, 0, 0)
+            return pos.x, pos.y, g.width, g.height
+        except error.XError:
+            # window was closed
+            self._window = None
+            return None
+
+    def locate(self):
+        if self._display is not None:
+            return self._xlib_geometry()
+        return wmctrl_window_geometry(self.window_keyword)
+
+    def geometry(self):
+        """starts tracking on the first call and waits (locate_timeout) for the window to be located"""
+        if self.ident is None:
+            self.start()
+        self._located.wait(self.locate_timeout)
+        with self._lock:
+            return self._geometry
+
+    def _refresh(self):
+        geometry = self.locate()
+        with self._lock:
+            previous = self._geometry
+            if geometry is None or geometry == previous:
+                return
+            self._geometry = geometry
+        if previous is not None:
+            lprint(self, f"window geometry changed: {previous} -> {geometry}")
+            self.n_updates += 1
+        if GloablStatus.monitor is not None:
+            # swap the whole dict, readers never see a half updated rect
+            GloablStatus.monitor = geometry_to_monitor(geometry)
+
+    def _wait_event(self):
+        from Xlib import X
+        fd = self._display.fileno()
+        changed = False
+        if self._display.pending_events() == 0:
+            select.select([fd], [], [], self.poll_interval)
+        while self._display.pending_events() > 0:
+            ev = self._display.next_event()
+            if ev.type == X.ConfigureNotify:
+                changed = True
+        return changed
+
+    def run(self):
+        try:
+            self._open_display()
+            self._refresh()
+            self._located.set()
+            while not self._stop_event.is_set() and not GloablStatus.stop_event.is_set():
+                if self._display is not None:
+                    self._wait_event()
+                else:
+                    self._stop_event.wait(self.poll_interval)
+                self._refresh()
+        except Exception as e:
+            lprint(self, f"Warning: geometry tracking stopped, {e!r}")
+        finally:
+            self._located.set()
+            if self._display is not None:
+                self._display.close()
+                self._display = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def fresh(self):
+        """unstarted tracker for the same window, a thread can only be started once"""
+        return type(self)(self.window_keyword, self.poll_interval, self.locate_timeout)
+
+
+class FakeGeometryTracker:
+    """fixed, injectable geometry for tests and headless runs"""
+    def __init__(self, geometry=None):
+        self._geometry = geometry if geometry is not None else (0, 0) + tuple(cfg.sz_wh)
+        self.n_updates = 0
+
+    def geometry(self):
+        return self._geometry
+
+    def set_geometry(self, geometry):
+        self._geometry = geometry
+        self.n_updates += 1
+        if GloablStatus.monitor is not None and geometry is not None:
+            GloablStatus.monitor = geometry_to_monitor(geometry)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def is_alive(self):
+        return False
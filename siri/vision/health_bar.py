@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+
+
+class HealthBarClassifier:
+    """
+    Batched version of Detector.detect_health_bar: tells enemies from friends by the health bar
+    colour above every player box of a frame in one pass.
+    The union of the ROIs is converted to HSV once, the enemy / friendly masks go through
+    cv2.integral, and each box then costs four lookups per mask.
+    When the boxes are spread out and their union is mostly background, the ROIs are packed into
+    one strip instead and counted with a single reshape.
+    """
+    ROI_H, ROI_W = 60, 100
+
+    def __init__(self, lower_enemy, upper_enemy, lower_friendly, upper_friendly, friendly_min_pixels=100, union_max_ratio=2.):
+        self.lower_enemy = np.asarray(lower_enemy)
+        self.upper_enemy = np.asarray(upper_enemy)
+        self.lower_friendly = np.asarray(lower_friendly)
+        self.upper_friendly = np.asarray(upper_friendly)
+        self.friendly_min_pixels = friendly_min_pixels
+        # union / packed roi area above which the strip path is used
+        self.union_max_ratio = union_max_ratio
+        self._hsv = None
+        self._mask = None
+        self._strip = None
+
+    @staticmethod
+    def roi_rects(xyxy: np.ndarray, frame_w: int):
+        """health bar search area above each box, same geometry as Detector.detect_health_bar"""
+        x1, y1, x2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2]
+        y_u = y1.astype(np.int64)
+        x_center = ((x1 + x2) / 2).astype(np.int64)
+        y_top = np.maximum(y_u - HealthBarClassifier.ROI_H, 0)
+        y_bottom = np.maximum(y_u, 1)
+        x_l = np.maximum(x_center - HealthBarClassifier.ROI_W // 2, 0)
+        x_r = np.minimum(x_center + HealthBarClassifier.ROI_W // 2, frame_w)
+        return x_l, y_top, x_r, y_bottom
+
+    def _buffers(self, h, w):
+        if self._hsv is None or self._hsv.shape[0] < h or self._hsv.shape[1] < w:
+            H = max(h, 0 if self._hsv is None else self._hsv.shape[0])
+            W = max(w, 0 if self._hsv is None else self._hsv.shape[1])
+            self._hsv = np.empty((H, W, 3), dtype=np.uint8)
+            self._mask = np.empty((H, W), dtype=np.uint8)
+        return self._hsv[:h, :w], self._mask[:h, :w]
+
+    def _box_counts(self, integral, x_l, y_t, x_r, y_b):
+        # integral images count 255 per set pixel
+        return (integral[y_b, x_r] - integral[y_t, x_r] - integral[y_b, x_l] + integral[y_t, x_l]) // 255
+
+    def _count_union(self, frame, x_l, y_t, x_r, y_b):
+        # every count is relative to the corner of the union
+        ux, uy = int(x_l.min()), int(y_t.min())
+        uw, uh = int(x_r.max()) - ux, int(y_b.max()) - uy
+        hsv, mask = self._buffers(uh, uw)
+        cv2.cvtColor(frame[uy:uy + uh, ux:ux + uw], cv2.COLOR_BGR2HSV, dst=hsv)
+        x_l, x_r, y_t, y_b = x_l - ux, x_r - ux, y_t - uy, y_b - uy
+
+        cv2.inRange(hsv, self.lower_enemy, self.upper_enemy, dst=mask)
+        enemy_pixels = self._box_counts(cv2.integral(mask, sdepth=cv2.CV_32S), x_l, y_t, x_r, y_b)
+        cv2.inRange(hsv, self.lower_friendly, self.upper_friendly, dst=mask)
+        friendly_pixels = self._box_counts(cv2.integral(mask, sdepth=cv2.CV_32S), x_l, y_t, x_r, y_b)
+        return enemy_pixels, friendly_pixels
+
+    def _count_strip(self, frame, x_l, y_t, x_r, y_b):
+        # rois stacked into fixed ROI_H x ROI_W slots, zero (black, outside both colour ranges) padded
+        n = len(x_l)
+        if self._strip is None or self._strip.shape[0] < n * self.ROI_H:
+            self._strip = np.zeros((n * self.ROI_H, self.ROI_W, 3), dtype=np.uint8)
+        strip = self._strip[:n * self.ROI_H]
+        for k, (l, t, r, b) in enumerate(zip(x_l.tolist(), y_t.tolist(), x_r.tolist(), y_b.tolist())):
+            slot = strip[k * self.ROI_H:(k + 1) * self.ROI_H]
+            h, w = b - t, r - l
+            slot[:h, :w] = frame[t:b, l:r]
+            if h < self.ROI_H: slot[h:] = 0
+            if w < self.ROI_W: slot[:h, w:] = 0
+        hsv, mask = self._buffers(n * self.ROI_H, self.ROI_W)
+        cv2.cvtColor(strip, cv2.COLOR_BGR2HSV, dst=hsv)
+        cv2.inRange(hsv, self.lower_enemy, self.upper_enemy, dst=mask)
+        enemy_pixels = np.count_nonzero(mask.reshape(n, -1), axis=1)
+        cv2.inRange(hsv, self.lower_friendly, self.upper_friendly, dst=mask)
+        friendly_pixels = np.count_nonzero(mask.reshape(n, -1), axis=1)
+        return enemy_pixels, friendly_pixels
+
+    def classify(self, frame: np.ndarray, xyxy: np.ndarray, candidates: np.ndarray=None):
+        """
+        returns a bool array aligned with xyxy, True where a candidate box (all boxes when
+        candidates is None) carries an enemy health bar
+        """
+        n = len(xyxy)
+        is_enm = np.zeros(n, dtype=bool)
+        idx = np.arange(n) if candidates is None else np.flatnonzero(candidates)
+        if idx.size == 0:
+            return is_enm
+
+        x_l, y_t, x_r, y_b = self.roi_rects(xyxy[idx], frame.shape[1])
+        # degenerate rois count as enemies, as in detect_health_bar
+        bad = (y_t > y_b) | (x_l > x_r)
+        is_enm[idx[bad]] = True
+        ok = ~bad
+        if not ok.any():
+            return is_enm
+        idx, x_l, y_t, x_r, y_b = idx[ok], x_l[ok], y_t[ok], x_r[ok], y_b[ok]
+
+        union_area = (int(x_r.max()) - int(x_l.min())) * (int(y_b.max()) - int(y_t.min()))
+        if union_area <= self.union_max_ratio * len(idx) * self.ROI_H * self.ROI_W:
+            enemy_pixels, friendly_pixels = self._count_union(frame, x_l, y_t, x_r, y_b)
+        else:
+            enemy_pixels, friendly_pixels = self._count_strip(frame, x_l, y_t, x_r, y_b)
+
+        friendly = (friendly_pixels > enemy_pixels) & (friendly_pixels > self.friendly_min_pixels)
+        is_enm[idx] = ~friendly
+        return is_enm
@@ -1,14 +1,107 @@
-import os, cv2, torch
-from midas.dpt_depth import DPTDepthModel
+import os, cv2, time, torch, hashlib, threading
+import numpy as np
+import torch.nn.functional as F
 from torchvision.transforms import Compose
 from midas.transforms import Resize, NormalizeImage, PrepareForNet
-from midas.midas_net import MidasNet
-from midas.midas_net_custom import MidasNet_small
 
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+from siri.utils.device import device_policy
 
-def swin_256():
-    local_model_path = './dpt_swin2_tiny_256.pt'
-    assert os.path.exists(local_model_path)
+IMAGENET_MEAN, IMAGENET_STD = (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)
+HALF_MEAN, HALF_STD = (0.5, 0.5, 0.5), (0.5, 0.5, 0.5)
+
+
+class BatchDepthTransform:
+    """
+    Tensor version of crop_left_right -> pad(white_bg) -> cvtColor -> transform for a whole batch,
+    as DeepPredictor used to do per frame in numpy: uint8 BGR frames are cropped into a reusable
+    (pinned on cuda) uint8 buffer, moved to the device in one copy, and resized, padded, normalized
+    and made channels-first there, returning a (n, 3, h, w) float tensor of model_sz.
+    The Resize of the Compose pipelines is a no-op on these padded model_sz inputs (multiples of 32),
+    the fit resize of pad() is bilinear like cv2.INTER_LINEAR.
+    The returned tensor is a reused buffer too, valid until the next call.
+    """
+    def __init__(self, model_sz, mean, std, crop_ratio=0.3, dtype=torch.float32):
+        self.model_sz = tuple(model_sz)
+        self.crop_ratio = crop_ratio
+        self.dtype = dtype
+        std = torch.tensor(std, dtype=torch.float32)
+        mean = torch.tensor(mean, dtype=torch.float32)
+        # x / 255 normalized in one multiply-add per pixel
+        self._scale = (1 / (255 * std)).view(1, 3, 1, 1)
+        self._shift = (-mean / std).view(1, 3, 1, 1)
+        self._host = None
+        self._geometry = {}
+        self._device_consts = {}  # device -> (scale, shift)
+        self._out = {}  # (n, dtype, device, inference mode) -> [padded geometry, output]
+
+    def geometry(self, hw):
+        """crop columns, size after the fit resize and offsets in model_sz, like crop_left_right + pad"""
+        if hw not in self._geometry:
+            h, w = hw
+            x_l = int(w * self.crop_ratio / 2)
+            x_r = w - int(w * self.crop_ratio / 2)
+            to_w, to_h = self.model_sz
+            width = x_r - x_l
+            if to_h / h < to_w / width:
+                new_w, new_h = int(width * to_h / h), to_h
+            else:
+                new_w, new_h = to_w, int(h * to_w / width)
+            self._geometry[hw] = (x_l, x_r, new_h, new_w, (to_h - new_h) // 2, (to_w - new_w) // 2)
+        return self._geometry[hw]
+
+    def _host_buffer(self, n, h, w):
+        if self._host is None or self._host.shape[0] < n or self._host.shape[1:3] != (h, w):
+            self._host = torch.empty((max(n, 0 if self._host is None else self._host.shape[0]), h, w, 3),
+                                     dtype=torch.uint8, pin_memory=device_policy.is_cuda)
+        return self._host[:n]
+
+    def _consts(self, device):
+        if device not in self._device_consts:
+            self._device_consts[device] = (self._scale.to(device), self._shift.to(device))
+        return self._device_consts[device]
+
+    def _out_buffer(self, n, device, geometry, scale, shift):
+        """(n, 3, h, w) output of model_sz, its pad (normalized white) only rewritten when geometry changes"""
+        key = (n, self.dtype, device, torch.is_inference_mode_enabled())
+        if key not in self._out:
+            to_w, to_h = self.model_sz
+            self._out[key] = [None, torch.empty((n, 3, to_h, to_w), dtype=self.dtype, device=device)]
+        slot = self._out[key]
+        if slot[0] != geometry:
+            slot[1].copy_((255 * scale + shift).expand_as(slot[1]))
+            slot[0] = geometry
+        return slot[1]
+
+    def __call__(self, batch):
+        hw = batch[0].shape[:2]
+        x_l, x_r, new_h, new_w, top, left = self.geometry(hw)
+        # the host buffer is reused by the next call, which only comes after the previous batch
+        # went through the model and was synchronized by .cpu()
+        host = self._host_buffer(len(batch), hw[0], x_r - x_l)
+        host_np = host.numpy()
+        for i, frame in enumerate(batch):
+            assert frame.shape[:2] == hw
+            host_np[i] = frame[:, x_l:x_r]
+        device = device_policy.device
+        # NHWC uint8 viewed as channels_last NCHW
+        x = host.to(device, non_blocking=device_policy.is_cuda).permute(0, 3, 1, 2)
+        if (new_h, new_w) != tuple(x.shape[2:]):
+            # the cpu kernel resizes uint8 directly, about 10x faster than in float
+            x = x if x.device.type == 'cpu' else x.float()
+            x = F.interpolate(x, size=(new_h, new_w), mode='bilinear', align_corners=False)
+        scale, shift = self._consts(device)
+        out = self._out_buffer(len(batch), device, (top, left, new_h, new_w), scale, shift)
+        # BGR -> RGB, normalized straight into the padded output
+        out[:, :, top:top + new_h, left:left + new_w] = torch.addcmul(shift, x.flip(1).float(), scale)
+        return out
+
+
+def swin_256(local_model_path='./dpt_swin2_tiny_256.pt'):
+    if not os.path.exists(local_model_path):
+        raise FileNotFoundError(f"swin_256 weights not found at {local_model_path}")
+    from midas.dpt_depth import DPTDepthModel
     model = DPTDepthModel(
         path=local_model_path,
         backbone="swin2t16_256",
@@ -34,11 +127,12 @@ def swin_256():
     model_sz = (256, 256,)
 
     print(f"loaded {local_model_path}")
-    return model, transform, model_sz
+    return model, transform, model_sz, BatchDepthTransform(model_sz, HALF_MEAN, HALF_STD)
 
-def swin_l_384():
-    local_model_path = './dpt_swin_large_384.pt'
-    assert os.path.exists(local_model_path)
+def swin_l_384(local_model_path='./dpt_swin_large_384.pt'):
+    if not os.path.exists(local_model_path):
+        raise FileNotFoundError(f"swin_l_384 weights not found at {local_model_path}")
+    from midas.dpt_depth import DPTDepthModel
     model = DPTDepthModel(
         path=local_model_path,
         backbone="swinl12_384",
@@ -65,11 +159,12 @@ def swin_l_384():
     model_sz = (384, 384,)
 
     print(f"loaded {local_model_path}")
-    return model, transform, model_sz
+    return model, transform, model_sz, BatchDepthTransform(model_sz, HALF_MEAN, HALF_STD)
 
-def dpt_hybrid_384():
-    local_model_path = './dpt_hybrid_384.pt'
-    assert os.path.exists(local_model_path)
+def dpt_hybrid_384(local_model_path='./dpt_hybrid_384.pt'):
+    if not os.path.exists(local_model_path):
+        raise FileNotFoundError(f"dpt_hybrid_384 weights not found at {local_model_path}")
+    from midas.dpt_depth import DPTDepthModel
     model = DPTDepthModel(
         path=local_model_path,
         backbone="vitb_rn50_384",
@@ -95,13 +190,14 @@ def dpt_hybrid_384():
     model_sz = (384, 384,)
 
     print(f"loaded {local_model_path}")
-    return model, transform, model_sz
+    return model, transform, model_sz, BatchDepthTransform(model_sz, HALF_MEAN, HALF_STD)
 
 
 
-def midas_small_256():
-    local_model_path = './midas_v21_small_256.pt'
-    assert os.path.exists(local_model_path)
+def midas_small_256(local_model_path='./midas_v21_small_256.pt'):
+    if not os.path.exists(local_model_path):
+        raise FileNotFoundError(f"midas_small_256 weights not found at {local_model_path}")
+    from midas.midas_net_custom import MidasNet_small
     model = MidasNet_small(path=local_model_path, features=64, backbone="efficientnet_lite3", exportable=True, non_negative=True, blocks={'expand': True})
     transform = Compose(
         [
@@ -123,4 +219,156 @@ def midas_small_256():
     model_sz = (256, 256,)
 
     print(f"loaded {local_model_path}")
-    return model, transform, model_sz
\ No newline at end of file
+    return model, transform, model_sz, BatchDepthTransform(model_sz, IMAGENET_MEAN, IMAGENET_STD)
+
+
+# name: (factory, model_sz, mean, std)
+DEPTH_MODELS = {
+    'midas_small_256': (midas_small_256, (256, 256,), IMAGENET_MEAN, IMAGENET_STD),
+    'swin_256': (swin_256, (256, 256,), HALF_MEAN, HALF_STD),
+    'dpt_hybrid_384': (dpt_hybrid_384, (384, 384,), HALF_MEAN, HALF_STD),
+    'swin_l_384': (swin_l_384, (384, 384,), HALF_MEAN, HALF_STD),
+}
+
+
+class DepthModelEntry:
+    def __init__(self, name, variant, model, transform, model_sz, batch_transform, dtype):
+        self.name = name
+        self.variant = variant
+        self.model = model
+        # the per frame Compose transform, None for a traced model loaded from the cache
+        self.transform = transform
+        self.model_sz = model_sz
+        self.batch_transform = batch_transform
+        self.dtype = dtype
+        self.load_s = 0.
+        self.param_mb = 0.
+        self.cuda_mb = 0.
+
+    def __iter__(self):
+        # model, transform, model_sz, batch_transform = entry, like the factories return
+        return iter((self.model, self.transform, self.model_sz, self.batch_transform))
+
+    def __str__(self):
+        return f"{self.name}[{self.variant}]: load={self.load_s:.2f}s params={self.param_mb:.1f}MB cuda=+{self.cuda_mb:.1f}MB"
+
+
+class DepthModelZoo:
+    """
+    Loads the DEPTH_MODELS by name on first use and hands the same instance (on device_policy.device,
+    eval mode) to every user of the same (name, variant, weights). Shared models are for inference,
+    nobody should train them in place; a module that embeds one (the DVNet variants) deepcopies it.
+
+    variant:
+        'eager': the python module in float32
+        'half': a float16 copy on cuda, the same as 'eager' elsewhere
+        'traced': torch.jit.trace at batch 1 and model_sz in device_policy.dtype, saved under cache_dir
+                  keyed by the weights file; later starts load it without building the python model
+    """
+    VARIANTS = ('eager', 'half', 'traced')
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+        self._entries = {}
+
+    @staticmethod
+    def _weights_key(path, n_chars=16):
+        # path, size and mtime of the checkpoint, cheap and enough to invalidate the cache
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"depth model weights not found at {path}")
+        st = os.stat(path)
+        return hashlib.sha1(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:n_chars]
+
+    def _cache_path(self, name, weights, suffix):
+        cache_dir = self.cache_dir if self.cache_dir is not None else f"{cfg.root_dir}/{cfg.depth_cache_dir}"
+        return os.path.join(cache_dir, f"{name}-{self._weights_key(weights)}-{suffix}")
+
+    @staticmethod
+    def _default_weights(name):
+        return DEPTH_MODELS[name][0].__defaults__[0]
+
+    def get(self, name, variant='eager', weights=None) -> DepthModelEntry:
+        assert variant in self.VARIANTS, variant
+        if name not in DEPTH_MODELS:
+            raise ValueError(f"unknown depth model {name!r}, choose from {list(DEPTH_MODELS)}")
+        if variant == 'half' and not device_policy.is_cuda:
+            variant = 'eager'
+        weights = weights if weights is not None else self._default_weights(name)
+        key = (name, variant, os.path.abspath(weights))
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = self._load(name, variant, weights)
+            return self._entries[key]
+
+    def _load(self, name, variant, weights):
+        factory, model_sz, mean, std = DEPTH_MODELS[name]
+        weights = weights if weights is not None else self._default_weights(name)
+        device = device_policy.device
+        dtype = torch.float32 if variant == 'eager' else device_policy.dtype
+        cuda_before = device_policy.memory_allocated_gb()
+        t0 = time.perf_counter()
+
+        if variant == 'traced':
+            path = self._cache_path(name, weights, f"{str(dtype).replace('torch.', '')}-{device.type}.ts")
+            if not os.path.exists(path):
+                self._trace(name, weights, dtype, path)
+            model, transform = torch.jit.load(path, map_location=device), None
+        else:
+            model, transform, _, _ = factory(weights)
+            model = model.to(device, dtype=dtype)
+        model.eval()
+
+        entry = DepthModelEntry(name, variant, model, transform, model_sz, BatchDepthTransform(model_sz, mean, std, dtype=dtype), dtype)
+        entry.load_s = time.perf_counter() - t0
+        entry.param_mb = sum(p.numel() * p.element_size() for p in model.parameters()) / 1048576
+        entry.cuda_mb = (device_policy.memory_allocated_gb() - cuda_before) * 1024
+        lprint(self, f"loaded {entry}")
+        return entry
+
+    def _trace(self, name, weights, dtype, path):
+        factory, model_sz, _, _ = DEPTH_MODELS[name]
+        device = device_policy.device
+        base = self._entries.get((name, 'eager' if dtype == torch.float32 else 'half', os.path.abspath(weights)))
+        if base is not None:
+            model = base.model
+        else:
+            # nobody uses the python module, it is built for tracing only and freed on return
+            model, _, _, _ = factory(weights)
+            model = model.to(device, dtype=dtype).eval()
+        example = torch.zeros((1, 3) + tuple(reversed(model_sz)), device=device, dtype=dtype)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example, check_trace=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, a concurrent reader never sees half a file
+        torch.jit.save(traced, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        lprint(self, f"traced {name} saved to {path}")
+
+    def export_onnx(self, name, batch=1, weights=None, opset=17):
+        """
+        static shape (batch, 3, model_sz) float32 ONNX export of the eager model, cached next to the
+        traced ones; runs on siri.vision.onnx_engine.ONNX_RUNTIMES
+        """
+        _, model_sz, _, _ = DEPTH_MODELS[name]
+        weights = weights if weights is not None else self._default_weights(name)
+        path = self._cache_path(name, weights, f"{model_sz[1]}x{model_sz[0]}-b{batch}.onnx")
+        if os.path.exists(path):
+            return path
+        model = self.get(name, 'eager', weights).model
+        example = torch.zeros((batch, 3) + tuple(reversed(model_sz)), device=next(model.parameters()).device)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lprint(self, f"exporting {name} batch={batch}, cache miss")
+        with torch.no_grad():
+            torch.onnx.export(model, example, path + '.tmp', input_names=['images'], output_names=['depth'],
+                              opset_version=opset, dynamo=False)
+        os.replace(path + '.tmp', path)
+        lprint(self, f"saved to {path}")
+        return path
+
+    def report(self):
+        with self._lock:
+            return '\n'.join(str(entry) for entry in self._entries.values())
+
+
+depth_zoo = DepthModelZoo()
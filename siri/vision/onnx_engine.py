@@ -0,0 +1,189 @@
+import os
+import cv2
+import copy
+import shutil
+import hashlib
+import torch
+import numpy as np
+from typing import Union, List
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+
+try:
+    from ultralytics.utils.nms import non_max_suppression
+except ImportError:
+    from ultralytics.utils.ops import non_max_suppression
+
+
+def weights_hash(model, n_chars=16):
+    """sha1 of the checkpoint file, or of the state dict when the model was not loaded from a file"""
+    h = hashlib.sha1()
+    ckpt_path = getattr(model, 'ckpt_path', None)
+    if ckpt_path and os.path.exists(ckpt_path):
+        with open(ckpt_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    else:
+        for k, v in model.model.state_dict().items():
+            h.update(k.encode())
+            h.update(v.detach().cpu().numpy().tobytes())
+    return h.hexdigest()[:n_chars]
+
+
+def export_onnx_cached(model, imgsz=None, batch=1, cache_dir=None):
+    """
+    exports a YOLO model to a static shape ONNX file, cached under cache_dir by weight hash,
+    input size and batch; the same file serves onnxruntime and openvino
+    """
+    from ultralytics import YOLO
+    imgsz = tuple(imgsz) if imgsz is not None else tuple(reversed(cfg.sz_wh))
+    cache_dir = cache_dir if cache_dir is not None else f"{cfg.root_dir}/{cfg.onnx_cache_dir}"
+    path = os.path.join(cache_dir, f"{weights_hash(model)}-{imgsz[0]}x{imgsz[1]}-b{batch}.onnx")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    ckpt_path = getattr(model, 'ckpt_path', None)
+    # export from a private copy, exporting fuses and moves the model
+    src = YOLO(ckpt_path, task='detect') if ckpt_path else copy.deepcopy(model)
+    lprint('export_onnx_cached', f"exporting {ckpt_path or 'model'} imgsz={imgsz} batch={batch}, cache miss")
+    exported = src.export(format='onnx', imgsz=imgsz, batch=batch, dynamic=False, half=False, simplify=True, device='cpu', verbose=False)
+    # write then rename, a concurrent reader never sees half a file
+    shutil.move(str(exported), path + '.tmp')
+    os.replace(path + '.tmp', path)
+    lprint('export_onnx_cached', f"saved to {path}")
+    return path
+
+
+def default_num_threads():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class OrtSession:
+    def __init__(self, onnx_path, num_threads):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_shape = tuple(self.session.get_inputs()[0].shape)
+
+    def __call__(self, x: np.ndarray):
+        return self.session.run(None, {self.input_name: x})[0]
+
+
+class OpenVinoSession:
+    def __init__(self, onnx_path, num_threads):
+        import openvino as ov
+        core = ov.Core()
+        ov_model = core.read_model(onnx_path)
+        self.input_shape = tuple(ov_model.inputs[0].get_shape())
+        self.compiled = core.compile_model(ov_model, 'CPU', {'INFERENCE_NUM_THREADS': num_threads, 'PERFORMANCE_HINT': 'LATENCY'})
+        self.request = self.compiled.create_infer_request()
+
+    def __call__(self, x: np.ndarray):
+        self.request.infer({0: x})
+        return self.request.get_output_tensor(0).data
+
+
+ONNX_RUNTIMES = {
+    'onnxruntime': OrtSession,
+    'openvino': OpenVinoSession,
+}
+
+
+class OnnxInferenceEngine:
+    """
+    CPU deployment counterpart of InferenceEngine, same predict() contract (one Results per frame).
+    The model is exported once (see export_onnx_cached) with a static input of frame_wh (cfg.sz_wh by
+    default) letterboxed to the stride, frames are letterboxed straight into a preallocated float32 input buffer.
+    """
+    def __init__(self, model, runtime=None, num_threads=None, batch_size=1, frame_wh=None, **overrides):
+        from ultralytics.utils.checks import check_imgsz
+        runtime = runtime if runtime is not None else cfg.detector_backend
+        assert runtime in ONNX_RUNTIMES, runtime
+        self.runtime = runtime
+        self.names = model.names
+        self.conf = overrides.get('conf', cfg.conf_threshold)
+        self.iou = overrides.get('iou', 0.5)
+        self.max_det = overrides.get('max_det', 20)
+        self.num_threads = num_threads or cfg.onnx_threads or default_num_threads()
+        self.batch_size = batch_size
+
+        frame_wh = frame_wh if frame_wh is not None else cfg.sz_wh
+        imgsz = check_imgsz(list(reversed(frame_wh)), stride=int(max(model.model.stride)), min_dim=2)
+        self.onnx_path = export_onnx_cached(model, imgsz=imgsz, batch=batch_size)
+        self.session = ONNX_RUNTIMES[runtime](self.onnx_path, self.num_threads)
+        assert self.session.input_shape == (batch_size, 3, imgsz[0], imgsz[1]), self.session.input_shape
+
+        self._input = np.full(self.session.input_shape, 114 / 255, dtype=np.float32)
+        self._letterbox = None
+        lprint(self, f"{runtime} session ready, {self.onnx_path} threads={self.num_threads}")
+
+    def _letterbox_params(self, frame_hw):
+        if self._letterbox is None or self._letterbox[0] != frame_hw:
+            h, w = frame_hw
+            H, W = self._input.shape[2:]
+            r = min(H / h, W / w)
+            new_w, new_h = int(round(w * r)), int(round(h * r))
+            top = int(round((H - new_h) / 2 - 0.1))
+            left = int(round((W - new_w) / 2 - 0.1))
+            self._letterbox = (frame_hw, r, new_w, new_h, top, left)
+            self._input.fill(114 / 255)
+        return self._letterbox[1:]
+
+    def _fill_input(self, i, frame):
+        r, new_w, new_h, top, left = self._letterbox_params(frame.shape[:2])
+        if (new_w, new_h) != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        # BGR HWC uint8 -> RGB CHW float in [0, 1], written in place
+        np.multiply(frame[..., ::-1].transpose(2, 0, 1), 1 / 255,
+                    out=self._input[i, :, top:top + new_h, left:left + new_w], casting='unsafe')
+
+    def _predict_chunk(self, chunk: List[np.ndarray]):
+        from ultralytics.engine.results import Results
+        for i, frame in enumerate(chunk):
+            self._fill_input(i, frame)
+        preds = torch.from_numpy(np.ascontiguousarray(self.session(self._input)))
+        dets = non_max_suppression(preds, conf_thres=self.conf, iou_thres=self.iou, agnostic=False, max_det=self.max_det)
+
+        r, _, _, top, left = self._letterbox[1:]
+        results = []
+        for i, frame in enumerate(chunk):
+            det = dets[i]
+            det[:, [0, 2]] = ((det[:, [0, 2]] - left) / r).clamp_(0, frame.shape[1])
+            det[:, [1, 3]] = ((det[:, [1, 3]] - top) / r).clamp_(0, frame.shape[0])
+            results.append(Results(frame, path=f"image{i}.jpg", names=self.names, boxes=det))
+        return results
+
+    def predict(self, frame_or_batch: Union[np.ndarray, List[np.ndarray]]):
+        if isinstance(frame_or_batch, np.ndarray):
+            batch = [frame_or_batch]
+        elif isinstance(frame_or_batch, (list, tuple)):
+            batch = list(frame_or_batch)
+        else:
+            assert False, 'OnnxInferenceEngine takes BGR uint8 frames, turn cfg.manual_preprocess off'
+        if len(batch) == 0:
+            return []
+        assert len(batch[0].shape) == 3
+        # letterbox parameters are shared across a chunk
+        assert len({frame.shape for frame in batch}) == 1
+
+        results = []
+        for i in range(0, len(batch), self.batch_size):
+            results.extend(self._predict_chunk(batch[i:i + self.batch_size]))
+        return results
+
+    __call__ = predict
+
+    def predict_iter(self, frames):
+        """see InferenceEngine.predict_iter"""
+        for frame in frames:
+            yield frame, self.predict(frame)[0]
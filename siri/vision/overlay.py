@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+
+
+class HudOverlay:
+    """
+    Key / button panel of Visualizer.plot (wasd, fire, scope, 4 5 6 g) as one cached sprite.
+    The sprite and its mask cover the bounding box of the panel and are only redrawn when a key
+    changes state; every frame then costs one masked copy of a ~230x200 patch, whatever the keys.
+    The layout is the one plot used to draw directly, anchored to the bottom left of the frame.
+    """
+    KEY_COLOR_UP = (200, 200, 200)  # 按键松开时的颜色
+    KEY_COLOR_DOWN = (100, 100, 100)  # 按键按下时的颜色
+    DOT_COLOR_UP = (200, 200, 200)  # 圆点松开时的颜色
+    DOT_COLOR_DOWN = (100, 100, 255)  # 圆点按下时的颜色
+    KEY_SIZE = 30  # 按键方块的大小
+    DOT_SIZE = 24  # 圆点的半径
+
+    def __init__(self):
+        self._frame_shape = None
+        self._state = None
+        self.n_redraws = 0
+
+    def layout(self, frame_h):
+        """[(act key, 'key' or 'dot', label, x, y), ...] in drawing order"""
+        K, R = self.KEY_SIZE, self.DOT_SIZE
+        start_x = 10
+        start_y = frame_h - K - 10
+        elements = [('w', 'key', 'W', start_x + K, start_y - K),
+                    ('a', 'key', 'A', start_x, start_y),
+                    ('s', 'key', 'S', start_x + K, start_y),
+                    ('d', 'key', 'D', start_x + 2 * K, start_y)]
+        dot_x = start_x + 3 * K + 20
+        elements.append(('fire', 'dot', 'Fire', dot_x, start_y))
+        elements.append(('scope', 'dot', 'Scope', dot_x, start_y - 2 * R))
+        # 4, 5, 6, g
+        for i, key in enumerate(['4', '5', '6', 'g']):
+            elements.append((key, 'key', key.upper(), 10, start_y - 4 * K + i * K))
+        return elements
+
+    def _draw(self, img, kind, label, x, y, color, text_color):
+        if kind == 'key':
+            cv2.rectangle(img, (x, y), (x + self.KEY_SIZE, y + self.KEY_SIZE), color, -1)
+            cv2.putText(img, label, (x + 10, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, text_color, 1)
+        else:
+            cv2.circle(img, (x, y), self.DOT_SIZE, color, -1)
+            cv2.putText(img, label, (x - 20, y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, text_color, 1)
+
+    def _prepare(self, frame_shape):
+        self.elements = self.layout(frame_shape[0])
+        # every pixel the panel can touch, drawn once at full frame size to get the clipped bounding box
+        full_mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+        for _, kind, label, x, y in self.elements:
+            self._draw(full_mask, kind, label, x, y, 255, 255)
+        x0, y0, w, h = cv2.boundingRect(full_mask)
+        self._slice = (slice(y0, y0 + h), slice(x0, x0 + w))
+        self._origin = (x0, y0)
+        self._mask = np.ascontiguousarray(full_mask[self._slice])
+        self._sprite = np.zeros((h, w, 3), dtype=np.uint8)
+        self._frame_shape = frame_shape
+        self._state = None
+
+    def render(self, frame: np.ndarray, act: dict):
+        """draws the panel for act's key states into frame (in place)"""
+        if frame.shape != self._frame_shape:
+            self._prepare(frame.shape)
+        state = tuple(bool(act[key]) for key, *_ in self.elements)
+        if state != self._state:
+            # overlapping borders, so the whole panel is redrawn in order
+            x0, y0 = self._origin
+            for down, (_, kind, label, x, y) in zip(state, self.elements):
+                if kind == 'key':
+                    color = self.KEY_COLOR_DOWN if down else self.KEY_COLOR_UP
+                else:
+                    color = self.DOT_COLOR_DOWN if down else self.DOT_COLOR_UP
+                self._draw(self._sprite, kind, label, x - x0, y - y0, color, (0, 0, 0))
+            self._state = state
+            self.n_redraws += 1
+        # cv2.copyTo writes through the roi view, several times faster than a masked np.copyto
+        cv2.copyTo(self._sprite, self._mask, frame[self._slice])
+        return frame
+
+
+class DepthPanel:
+    """
+    Side by side frame | colour mapped depth, at most max_width wide, into reused buffers.
+    The depth side is colour mapped, centred and resized only when a new deep_frame arrives
+    (compared by identity, DepthWorker hands out the same array until its next estimate), the
+    frame side is one copy (and one resize when the result is downscaled).
+    """
+    def __init__(self, max_width=1200):
+        self.max_width = max_width
+        self._key = None
+        self._deep_src = None
+        self.n_depth_updates = 0
+
+    def _prepare(self, frame_shape, deep_shape):
+        fh, fw = frame_shape[:2]
+        dh, dw = deep_shape[:2]
+        h, w = max(fh, dh), fw + dw
+        scale = min(1., self.max_width / w)
+        # same rounding as resize_image_to_width, split between the two sides by their widths
+        self._out = np.zeros((int(h * scale) if scale < 1 else h, int(round(w * scale)), 3), dtype=np.uint8)
+        split = int(round(fw * scale))
+        self._frame_dst = self._fit(self._out[:, :split], fh, scale)
+        self._deep_dst = self._fit(self._out[:, split:], dh, scale)
+        self._key = (frame_shape, deep_shape)
+        self._deep_src = None
+
+    @staticmethod
+    def _fit(side, src_h, scale):
+        """view of side that receives a src_h high image, vertically centred on black"""
+        out_h = side.shape[0]
+        dst_h = min(int(round(src_h * scale)), out_h) if scale < 1 else src_h
+        top = (out_h - dst_h) // 2
+        return side[top:top + dst_h]
+
+    @staticmethod
+    def _colorize(deep_frame):
+        if deep_frame.ndim == 2:
+            # 归一化到 [0, 255]
+            depth_min = deep_frame.min()
+            depth_max = deep_frame.max()
+            if depth_max > depth_min:
+                deep_frame = 255 * (deep_frame - depth_min) / (depth_max - depth_min)
+            deep_frame = cv2.applyColorMap(np.uint8(deep_frame), cv2.COLORMAP_INFERNO)
+        return deep_frame
+
+    @staticmethod
+    def _put(dst, img):
+        if dst.shape[:2] == img.shape[:2]:
+            np.copyto(dst, img)
+        else:
+            cv2.resize(img, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+
+    def compose(self, frame: np.ndarray, deep_frame: np.ndarray):
+        key = (frame.shape, deep_frame.shape)
+        if key != self._key:
+            self._prepare(*key)
+        if deep_frame is not self._deep_src:
+            self._put(self._deep_dst, self._colorize(deep_frame))
+            self._deep_src = deep_frame
+            self.n_depth_updates += 1
+        self._put(self._frame_dst, frame)
+        return self._out
@@ -4,6 +4,7 @@ import numpy as np
 from typing import List, Union
 from ultralytics import YOLO
 from siri.global_config import GlobalConfig as cfg
+from siri.utils.device import device_policy
 
 
 def to_int(obj):
@@ -228,7 +229,7 @@ def pre_transform_crop(im):
 def pre_transform_pad(im, sz, **kwargs):
     return [pad(x, to_sz_wh=sz, **kwargs) for x in im]
 
-def preprocess(im: Union[np.ndarray, List[np.ndarray]]) -> torch.Tensor: # to('cuda')
+def preprocess(im: Union[np.ndarray, List[np.ndarray]]) -> torch.Tensor: # to(device_policy.device)
     assert len(im[0].shape) == 3 and im[0].shape[-1] == 3, "im shape should be (n, h, w, 3)"
     
     im = np.stack(pre_transform(im, cfg.sz_wh))
@@ -237,8 +238,8 @@ def preprocess(im: Union[np.ndarray, List[np.ndarray]]) -> torch.Tensor: # to('c
     im = np.ascontiguousarray(im)  # contiguous
     im = torch.from_numpy(im)
 
-    im = im.to('cuda')
-    im = im.half() if cfg.half else im.float()  # uint8 to fp16/32
+    im = device_policy.to(im)
+    im = im.to(device_policy.dtype)  # uint8 to fp16/32
     im /= 255  # 0 - 255 to 0.0 - 1.0
     return im
 
@@ -0,0 +1,151 @@
+import os
+import cv2
+import time
+import queue
+import threading
+import numpy as np
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+from siri.utils.pipeline import StageStats
+
+
+class VideoRecorder(threading.Thread):
+    """
+    Writes frames to video files in its own thread, the caller only pays for one copy (or resize)
+    into a preallocated buffer. At most queue_size frames wait for the encoder, when every buffer
+    is in use the frame is dropped (n_dropped) instead of blocking the caller.
+    every > 1 keeps one frame out of every, scale < 1 downsizes before the copy, segment_s > 0
+    starts a new file (path-000.mp4, path-001.mp4 ...) every segment_s seconds of video.
+    """
+    def __init__(self, path, fps, fourcc=None, scale=None, every=None, segment_s=None, queue_size=None):
+        super().__init__(name='recorder', daemon=True)
+        self.path = path
+        self.every = max(int(every if every is not None else cfg.record_every), 1)
+        self.fps = fps / self.every
+        self.fourcc = fourcc if fourcc is not None else cfg.record_fourcc
+        self.scale = scale if scale is not None else cfg.record_scale
+        self.segment_s = segment_s if segment_s is not None else cfg.record_segment_s
+        self.queue_size = queue_size if queue_size is not None else cfg.record_queue_size
+        self.stats = StageStats('record')
+        self.paths = []
+
+        self._queue = queue.Queue()
+        self._free = None  # buffers not waiting in _queue, allocated on the first frame
+        self._frame_shape = None
+        self._shape_warned = False
+        self._n_seen = 0
+        self.n_dropped = 0
+        self._closed = False
+        self._writer = None
+        self._n_written = 0  # frames in the current segment
+
+    def _prepare(self, frame_shape):
+        h, w = frame_shape[:2]
+        if self.scale != 1:
+            w, h = int(round(w * self.scale)) // 2 * 2, int(round(h * self.scale)) // 2 * 2
+        shape = (h, w) + tuple(frame_shape[2:])
+        self._free = queue.SimpleQueue()
+        for _ in range(self.queue_size):
+            self._free.put(np.empty(shape, dtype=np.uint8))
+        self._out_wh = (w, h)
+        self._frame_shape = frame_shape
+
+    def submit(self, frame: np.ndarray):
+        """queue a copy of frame for writing, never waits; returns False when the frame is skipped or dropped"""
+        if self._closed:
+            return False
+        self._n_seen += 1
+        if (self._n_seen - 1) % self.every != 0:
+            return False
+        if frame.shape != self._frame_shape:
+            if self._frame_shape is not None:
+                # the open file keeps its size, frames of another shape are not recorded
+                if not self._shape_warned:
+                    lprint(self, f"Warning: frame shape changed {self._frame_shape} -> {frame.shape}, frames dropped")
+                    self._shape_warned = True
+                self.n_dropped += 1
+                return False
+            self._prepare(frame.shape)
+        if self.ident is None:
+            self.start()
+        try:
+            buffer = self._free.get_nowait()
+        except queue.Empty:
+            self.n_dropped += 1
+            return False
+        if buffer.shape == frame.shape:
+            np.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, self._out_wh, dst=buffer, interpolation=cv2.INTER_AREA)
+        self._queue.put((time.monotonic(), buffer))
+        return True
+
+    def _segment_path(self):
+        if self.segment_s is None or self.segment_s <= 0:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}-{len(self.paths):03d}{ext}"
+
+    def _open(self):
+        path = self._segment_path()
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self._out_wh)
+        if not writer.isOpened():
+            raise RuntimeError(f"cannot open {path} with fourcc {self.fourcc!r}")
+        self.paths.append(path)
+        self._writer = writer
+        self._n_written = 0
+        lprint(self, f"recording to {path}")
+
+    def _write(self, buffer):
+        if self._writer is not None and self.segment_s is not None and self.segment_s > 0 \
+                and self._n_written >= self.segment_s * self.fps:
+            self._writer.release()
+            self._writer = None
+        if self._writer is None:
+            self._open()
+        self._writer.write(buffer)
+        self._n_written += 1
+
+    def run(self):
+        try:
+            while True:
+                packet = self._queue.get()
+                if packet is None:
+                    break
+                t_frame, buffer = packet
+                t0 = time.monotonic()
+                try:
+                    self._write(buffer)
+                finally:
+                    self._free.put(buffer)
+                t1 = time.monotonic()
+                self.stats.record(t1 - t0, age=t1 - t_frame)
+        except Exception as e:
+            lprint(self, f"Error: recording stopped, {e!r}")
+            self._closed = True
+        finally:
+            if self._writer is not None:
+                self._writer.release()
+                self._writer = None
+
+    def stop(self, timeout=5.):
+        """writes what is already queued, then closes the current file"""
+        self._closed = True
+        if self.is_alive():
+            self._queue.put(None)
+            self.join(timeout=timeout)
+
+    def summary(self, reset=True):
+        """same interface as StageStats.summary"""
+        buff = f"{self.stats.summary(reset)} queued={self._queue.qsize()} dropped={self.n_dropped}"
+        if reset:
+            self.n_dropped = 0
+        return buff
+
+
+def make_video_recorder(path, fps):
+    """VideoRecorder set up from cfg.record_*, None when recording is disabled"""
+    if not cfg.record_video or path is None:
+        return None
+    return VideoRecorder(path, fps)
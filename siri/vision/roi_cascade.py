@@ -0,0 +1,117 @@
+import threading
+import numpy as np
+import supervision as sv
+
+from siri.global_config import GlobalConfig as cfg
+from siri.vision.engine import make_inference_engine
+
+
+class RoiCascade:
+    """
+    Detects in a roi_wh crop around the confidently tracked targets instead of the whole frame.
+    The crop is centered on the union of the tracked boxes (grown by margin) shifted by their last
+    motion, and runs through a second engine whose input is the crop size, i.e. the same scale as
+    a full frame scan at a fraction of the pixels. detect() returns None when a full frame scan is
+    due instead: no confident track, targets spread wider than the crop, every full_every frames,
+    or nothing found in the crop (track loss), in which case the same frame is scanned again.
+    """
+    def __init__(self, model, roi_wh=None, min_conf=None, full_every=None, margin=None, classes=None):
+        self.roi_wh = tuple(roi_wh if roi_wh is not None else cfg.cascade_roi_wh)
+        self.min_conf = min_conf if min_conf is not None else cfg.cascade_min_conf
+        self.full_every = full_every if full_every is not None else cfg.cascade_full_every
+        self.margin = margin if margin is not None else cfg.cascade_margin
+        self.classes = np.asarray(classes if classes is not None else cfg.cascade_classes)
+        self.engine = make_inference_engine(model, frame_wh=self.roi_wh)
+        self._lock = threading.Lock()
+        self._box = None
+        self._velocity = np.zeros(2, dtype=np.float32)
+        self._since_full = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.n_roi = 0
+            self.n_full = 0
+            self.n_lost = 0
+
+    def _confident(self, detections: sv.Detections):
+        keep = np.isin(detections.class_id, self.classes)
+        if detections.confidence is not None:
+            keep &= detections.confidence >= self.min_conf
+        return keep
+
+    def observe(self, tracked: sv.Detections, frame_shape):
+        """tracker output of the current frame, sets up the crop of the next one"""
+        keep = self._confident(tracked)
+        if tracked.tracker_id is not None:
+            keep &= tracked.tracker_id >= 0
+        if not keep.any():
+            self._box = None
+            return
+        xyxy = tracked.xyxy[keep]
+        box = np.concatenate((xyxy[:, :2].min(axis=0), xyxy[:, 2:4].max(axis=0)))
+        if box[2] - box[0] > self.roi_wh[0] or box[3] - box[1] > self.roi_wh[1]:
+            # too spread out for one crop, follow the box nearest to the frame center
+            center = np.array([frame_shape[1], frame_shape[0]], dtype=np.float32) / 2
+            d = np.square((xyxy[:, :2] + xyxy[:, 2:4]) / 2 - center).sum(axis=1)
+            box = xyxy[int(np.argmin(d))].copy()
+        if self._box is not None:
+            self._velocity = (box[:2] + box[2:]) / 2 - (self._box[:2] + self._box[2:]) / 2
+        else:
+            self._velocity[:] = 0
+        self._box = box
+
+    def _plan(self, frame_shape):
+        """(x0, y0) of the crop, or None for a full frame scan"""
+        h, w = frame_shape[:2]
+        rw, rh = self.roi_wh
+        if self._box is None or self._since_full >= self.full_every or rw >= w or rh >= h:
+            return None
+        box = self._box
+        bw, bh = box[2] - box[0], box[3] - box[1]
+        if bw * (1 + self.margin) > rw or bh * (1 + self.margin) > rh:
+            return None
+        cx, cy = (box[:2] + box[2:]) / 2 + self._velocity
+        x0 = int(np.clip(round(cx - rw / 2), 0, w - rw))
+        y0 = int(np.clip(round(cy - rh / 2), 0, h - rh))
+        return x0, y0
+
+    def detect(self, frame: np.ndarray):
+        """detections in frame coordinates from the crop, or None when the frame needs a full scan"""
+        origin = self._plan(frame.shape)
+        if origin is None:
+            self._full()
+            return None
+        x0, y0 = origin
+        rw, rh = self.roi_wh
+        result = self.engine(frame[y0:y0 + rh, x0:x0 + rw])[0]
+        detections = sv.Detections.from_ultralytics(result)
+        if not self._confident(detections).any():
+            with self._lock:
+                self.n_lost += 1
+            self._box = None
+            self._full()
+            return None
+        detections.xyxy += np.array([x0, y0, x0, y0], dtype=detections.xyxy.dtype)
+        self._since_full += 1
+        with self._lock:
+            self.n_roi += 1
+        return detections
+
+    def _full(self):
+        self._since_full = 0
+        with self._lock:
+            self.n_full += 1
+
+    def stats(self):
+        with self._lock:
+            n = self.n_roi + self.n_full
+            return {'n_roi': self.n_roi, 'n_full': self.n_full, 'n_lost': self.n_lost,
+                    'roi_rate': self.n_roi / n if n > 0 else 0.}
+
+    def summary(self, reset=True):
+        """same interface as StageStats.summary"""
+        s = self.stats()
+        if reset:
+            self.reset_stats()
+        return f"roi_cascade: roi={s['roi_rate'] * 100:.1f}% full={s['n_full']} lost={s['n_lost']}"
@@ -0,0 +1,92 @@
+import cv2
+import time
+import numpy as np
+
+from siri.utils.timing import TimingHistogram
+
+
+class RoiColorCheck:
+    """
+    Counts the pixels of a fixed screen rect (scope button, minimap, ammo ...) that fall in the
+    colour box [lb, ub] and compares the count to thresh.
+    The clipped ROI slice and the mask buffer are set up once per frame shape, so a check is one
+    inRange and one countNonZero on a view of the frame. step > 1 samples every step-th row and
+    column (thresh stays in full resolution pixels and is scaled down accordingly).
+    """
+    def __init__(self, name, rect, lb, ub, thresh, step=1, hsv=False):
+        """rect: (x0, y0, x1, y1) in frame pixels, clipped to the frame"""
+        self.name = name
+        self.rect = tuple(int(v) for v in rect)
+        self.lb = np.asarray(lb)
+        self.ub = np.asarray(ub)
+        self.thresh = thresh
+        self.step = max(int(step), 1)
+        self.hsv = hsv
+        self.timing = TimingHistogram(name, capacity=1024)
+        self._frame_shape = None
+
+    @classmethod
+    def around(cls, name, x, y, r, lb, ub, thresh, **kwargs):
+        """square ROI of half size r centred on (x, y)"""
+        return cls(name, (x - r, y - r, x + r, y + r), lb, ub, thresh, **kwargs)
+
+    def _prepare(self, frame_shape):
+        h, w = frame_shape[:2]
+        x0, y0, x1, y1 = self.rect
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+        assert x1 > x0 and y1 > y0, f"{self.name}: roi {self.rect} is outside of the frame {frame_shape}"
+        self._slice = (slice(y0, y1, self.step), slice(x0, x1, self.step))
+        hw = (len(range(y0, y1, self.step)), len(range(x0, x1, self.step)))
+        # strided views are not accepted by cv2, the sample path gathers into _gather first
+        self._gather = np.empty(hw + (3,), dtype=np.uint8) if self.step > 1 else None
+        self._hsv = np.empty(hw + (3,), dtype=np.uint8) if self.hsv else None
+        self._mask = np.empty(hw, dtype=np.uint8)
+        self._thresh = self.thresh / (self.step * self.step)
+        self._frame_shape = frame_shape
+
+    def count(self, frame: np.ndarray):
+        """matching pixels in the (sampled) roi"""
+        if frame.shape != self._frame_shape:
+            self._prepare(frame.shape)
+        roi = frame[self._slice]
+        if self._gather is not None:
+            np.copyto(self._gather, roi)
+            roi = self._gather
+        if self._hsv is not None:
+            cv2.cvtColor(roi, cv2.COLOR_BGR2HSV, dst=self._hsv)
+            roi = self._hsv
+        cv2.inRange(roi, self.lb, self.ub, dst=self._mask)
+        return cv2.countNonZero(self._mask)
+
+    def __call__(self, frame: np.ndarray):
+        t0 = time.perf_counter()
+        hit = self.count(frame) > self._thresh
+        self.timing.record(time.perf_counter() - t0)
+        return hit
+
+
+class RoiColorStats:
+    """named set of fixed HUD checks evaluated on every frame, each with its own timing histogram"""
+    def __init__(self, checks=()):
+        self.checks = {}
+        for check in checks:
+            self.add(check)
+
+    def add(self, check: RoiColorCheck):
+        self.checks[check.name] = check
+        return check
+
+    def __getitem__(self, name):
+        return self.checks[name]
+
+    def check(self, name, frame):
+        return self.checks[name](frame)
+
+    def evaluate(self, frame):
+        return {name: check(frame) for name, check in self.checks.items()}
+
+    def summaries(self):
+        return {name: check.timing.summary() for name, check in self.checks.items()}
+
+    def summary(self):
+        return '\n'.join(str(check.timing) for check in self.checks.values())
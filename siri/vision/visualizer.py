@@ -1,18 +1,21 @@
-import sys
 import cv2
 import threading, time
 import numpy as np
+from collections import OrderedDict
 import supervision as sv
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QCoreApplication
-from matplotlib import pyplot as plt
 
-from siri.utils.sleeper import Sleeper
+from siri.utils.sleeper import TickScheduler
+from siri.utils.frame_ring import release_frame
+from siri.utils.pipeline import StatsReporter
 from siri.utils.logger import lprint, print_obj
+from siri.utils.tracer import traced
 from siri.global_config import GloablStatus
 from siri.global_config import GlobalConfig as cfg
-from siri.utils.img_window import ImageWindow
-from siri.vision.preprocess import to_int, resize_image_to_width
+from siri.utils.img_window import FrameDisplay
+from siri.utils.shm_ring import ShmFrameWriter
+from siri.vision.preprocess import to_int
+from siri.vision.overlay import HudOverlay, DepthPanel
+from siri.vision.recorder import make_video_recorder
 
 
 def is_zero(list_like):
@@ -22,6 +25,104 @@ def is_zero(list_like):
     return True
 
 
+class FrameActJoin:
+    """
+    Pairs the detector's sv_source with the operator's obs/act by frame sequence number ('seq').
+    Both sides are bounded (capacity entries, oldest dropped first, dropped frames go to on_drop).
+    pop() hands out the newest frame that has its act and skips every older frame, so the
+    visualizer never falls behind nor draws an act on the wrong frame. Frames whose act is late are
+    dropped unseen, the frame side only keeps the newest ones, so a late act still finds its frame.
+    Only when nothing could be paired for unpaired_after seconds (no operator, or acts lagging by
+    more than capacity frames) is the newest frame shown without an act.
+    """
+    def __init__(self, capacity=None, on_drop=release_frame, unpaired_after=None):
+        self.capacity = capacity if capacity is not None else cfg.visualizer_queue_size
+        self.unpaired_after = unpaired_after if unpaired_after is not None else cfg.visualizer_unpaired_after
+        self.on_drop = on_drop
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+        self._acts = OrderedDict()
+        self._last_seq = -1
+        self._t_paired = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        """counters only"""
+        self.n_shown = 0
+        self.n_dropped_frames = 0  # evicted by capacity
+        self.n_skipped_frames = 0  # older than a shown frame
+        self.n_unpaired = 0  # shown without act
+        self.n_dropped_acts = 0  # evicted by capacity or for a frame already gone
+
+    def _drop_frame(self, sv_source):
+        if self.on_drop is not None:
+            self.on_drop(sv_source)
+
+    def put_frame(self, seq, sv_source):
+        with self._lock:
+            if seq <= self._last_seq:
+                self.n_skipped_frames += 1
+                self._drop_frame(sv_source)
+                return
+            self._frames[seq] = sv_source
+            if len(self._frames) > self.capacity:
+                self.n_dropped_frames += 1
+                self._drop_frame(self._frames.popitem(last=False)[1])
+
+    def put_act(self, seq, obs_act):
+        with self._lock:
+            if seq <= self._last_seq:
+                self.n_dropped_acts += 1
+                return
+            self._acts[seq] = obs_act
+            if len(self._acts) > self.capacity:
+                self.n_dropped_acts += 1
+                self._acts.popitem(last=False)
+
+    def pop(self):
+        """(sv_source, obs_act or None) of the frame to draw next, or None"""
+        with self._lock:
+            paired = [seq for seq in self._frames if seq in self._acts]
+            if len(paired) > 0:
+                seq = paired[-1]
+                obs_act = self._acts.pop(seq)
+                self._t_paired = time.monotonic()
+            elif len(self._frames) > 0 and time.monotonic() - self._t_paired > self.unpaired_after:
+                # acts are not coming (in time), show the newest frame as it is
+                seq = next(reversed(self._frames))
+                obs_act = None
+                self.n_unpaired += 1
+            else:
+                return None
+            sv_source = self._frames.pop(seq)
+            self._last_seq = seq
+            while len(self._frames) > 0 and next(iter(self._frames)) < seq:
+                self.n_skipped_frames += 1
+                self._drop_frame(self._frames.popitem(last=False)[1])
+            while len(self._acts) > 0 and next(iter(self._acts)) < seq:
+                self.n_dropped_acts += 1
+                self._acts.popitem(last=False)
+            self.n_shown += 1
+            return sv_source, obs_act
+
+    def clear(self):
+        with self._lock:
+            for sv_source in self._frames.values():
+                self._drop_frame(sv_source)
+            self._frames.clear()
+            self._acts.clear()
+            self._t_paired = time.monotonic()
+
+    def summary(self, reset=True):
+        """same interface as StageStats.summary"""
+        with self._lock:
+            buff = (f"visualizer: shown={self.n_shown} skipped={self.n_skipped_frames} dropped={self.n_dropped_frames} "
+                    f"unpaired={self.n_unpaired} dropped_acts={self.n_dropped_acts}")
+            if reset:
+                self.reset()
+        return buff
+
+
 class Visualizer(threading.Thread):
     def __init__(self):
         super().__init__()
@@ -29,116 +130,111 @@ class Visualizer(threading.Thread):
         self.label_annotator = sv.LabelAnnotator()
         # self.draw_mutex = threading.Semaphore(value=0)
 
-        self.sv_source_queue: list[dict] = []
-        self.obs_act_data: list[dict] = []
+        # sv_source from the detector joined with obs / act from the operator by frame seq
+        self.frame_join = FrameActJoin()
 
         self.plt = cfg.plt
+        self.hud = HudOverlay()
+        self.depth_panel = DepthPanel()
 
         # self.save_video = None
-        self.save_video = f"{self.__class__.__name__}-{time.strftime("%Y%m%d-%H%M%S")}.mp4"
-        self.video_writer = None
+        self.save_video = f"{self.__class__.__name__}-{time.strftime("%Y%m%d-%H%M%S")}.{cfg.record_container}"
+        self.recorder = None
+        self.shm_writer = None
         self.video_writer_fps = 1/cfg.tick
         self.last_frame = None
+        self.canvas = None
     
     def run(self):
         lprint(self, "start")
         title = f"{self.__class__.__name__}"
+        sleeper = TickScheduler(user=self, stop_event=GloablStatus.stop_event)
+        reporter = StatsReporter([self.frame_join])
+        # encoding runs in its own thread (siri.vision.recorder), a slow encoder drops recorded frames
+        self.recorder = make_video_recorder(self.save_video, self.video_writer_fps)
+        if self.recorder is not None:
+            reporter.stats_list.append(self.recorder)
+        display = FrameDisplay(self.plt, title) if self.plt != 'shm' else None
         try:
             while not GloablStatus.stop_event.is_set():
                 # self.draw_mutex.acquire()
+                reporter.maybe_report()
 
-                sleeper = Sleeper(user=self)            
-                if len(self.sv_source_queue) == 0 or len(self.obs_act_data) == 0:
-                    if max(len(self.sv_source_queue), len(self.obs_act_data)) > 3:
-                        self.sv_source_queue = []
-                        self.obs_act_data = []
+                pair = self.frame_join.pop()
+                if pair is None:
                     if self.last_frame is None:
                         sleeper.sleep()
                         continue
+                    annotated_frame = self.last_frame
                 else:
-                    sv_source = self.sv_source_queue.pop(0)
-                    obs_act = self.obs_act_data.pop(0)
+                    sv_source, obs_act = pair
 
                     annotated_frame = self.plot(sv_source, obs_act)
-                    self.last_frame = annotated_frame.copy()
+                    release_frame(sv_source)
+                    # plot draws on self.canvas which is only rewritten by the next plot
+                    self.last_frame = annotated_frame
 
-                if self.save_video is not None:
-                    if self.video_writer is None:
-                        h, w, _ = annotated_frame.shape
-                        self.frame_size = (w, h)
-                        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                        self.video_writer = cv2.VideoWriter(self.save_video, fourcc, self.video_writer_fps, self.frame_size)
-                    self.video_writer.write(annotated_frame)
+                if self.recorder is not None:
+                    self.recorder.submit(annotated_frame)
 
 
-                if self.plt == 'plt':
-                    if not hasattr(self, 'img'):
-                        self.fig, ax = plt.subplots()
-                        ax.set_title(title)
-                        self.img = ax.imshow(annotated_frame)
-                        ax.axis('off')
-                        plt.ion()
-                        plt.show()
-                    annotated_frame = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-                    self.img.set_data(annotated_frame)
-                    self.fig.canvas.draw()
-                    self.fig.canvas.flush_events()
-                elif self.plt == 'cv2':
-                    cv2.imshow(title, annotated_frame)
-                    cv2.waitKey(1)
-                elif self.plt == 'qt':
-                    if not hasattr(self, 'img'):
-                        # BUG, WARNING: QApplication was not created in the main() thread.
-                        self.app = QApplication(sys.argv)
-                        self.img = ImageWindow(title=title)
-                        self.img.show()
-                    self.img.update_image(annotated_frame)
-                    self.app.processEvents()
+                if self.plt == 'shm':
+                    # shown by external viewer processes (viewer.py), the ring is sized by the first frame
+                    if pair is not None:
+                        if self.shm_writer is None:
+                            self.shm_writer = ShmFrameWriter(cfg.shm_name, annotated_frame.shape, n_slots=cfg.shm_slots)
+                        self.shm_writer.write(annotated_frame, {'seq': int(sv_source['seq'])})
                 else:
-                    raise NotImplementedError()
+                    display.show(annotated_frame)
                 sleeper.sleep()
         except KeyboardInterrupt:
             lprint(self, "Sig INT catched, stopping session.")
         finally:
-            if self.video_writer is not None:
-                self.video_writer.release()
-            self.sv_source_queue = []
-            self.obs_act_data = []
-            if hasattr(self, 'img'):
-                # self.app.quit()
-                # self.app.exit(0)
-                app = QCoreApplication.instance()
-                if app is not None:
-                    app.quit()
+            if self.recorder is not None:
+                self.recorder.stop()
+            self.frame_join.clear()
+            if display is not None:
+                display.close()
+            if self.shm_writer is not None:
+                self.shm_writer.close()
+                self.shm_writer = None
 
         lprint(self, "finish")
 
     def draw_sv_source(self, sv_source: dict):
         lprint(self, "draw_sv_source called", debug=True)
         assert isinstance(sv_source, dict)
-        self.sv_source_queue.append(sv_source)
+        self.frame_join.put_frame(sv_source['seq'], sv_source)
     
     def draw_obs_act(self, data: dict):
         lprint(self, "draw_obs_act called", debug=True)
-        # assert isinstance(data, dict) and data is not None
-        # last_action_data = self.action_data; 
-        self.obs_act_data.append(data)
-        # if last_action_data is None:
-        #     self.draw_mutex.release()
+        # None: the operator skipped a tick, nothing to pair
+        if data is None:
+            return
+        self.frame_join.put_act(data['seq'], data)
     
+    @traced('plot')
     def plot(self, sv_source, obs_act):
         assert isinstance(sv_source, dict)
         frame = sv_source['frame']
         deep_frame = sv_source['deep_frame']
         assert frame is not None
 
-        
+        # sv_source['frame'] may be shared with the detector and operator, draw on a private canvas
+        if self.canvas is None or self.canvas.shape != frame.shape:
+            self.canvas = np.empty_like(frame)
+        np.copyto(self.canvas, frame)
+        frame = self.canvas
+
+        if sv_source.get('scope_circle') is not None:
+            center, radius, color = sv_source['scope_circle']
+            cv2.circle(frame, center, radius, color, thickness=7)
         
         # draw supervision boxes
         if sv_source['detections'] is not None:
             # labels = [f"#{tracker_id}" for tracker_id in detections.tracker_id]
             frame = self.box_annotator.annotate(
-                scene=frame.copy(), detections=sv_source['detections'])
+                scene=frame, detections=sv_source['detections'])
             frame = self.label_annotator.annotate(
                 scene=frame, detections=sv_source['detections'])
 
@@ -174,99 +270,11 @@ class Visualizer(threading.Thread):
                 )
             
             ## keys
-            # wasd
-            KEY_COLOR_UP = (200, 200, 200)  # 按键松开时的颜色
-            KEY_COLOR_DOWN = (100, 100, 100)  # 按键按下时的颜色
-            DOT_COLOR_UP = (200, 200, 200)  # 圆点松开时的颜色
-            DOT_COLOR_DOWN = (100, 100, 255)  # 圆点按下时的颜色
-            KEY_SIZE = 30  # 按键方块的大小
-            DOT_SIZE = 24  # 圆点的半径
-            start_x = 10
-            start_y = GloablStatus.monitor['height'] - KEY_SIZE - 10
-            keys = [('w', (start_x + KEY_SIZE, start_y - KEY_SIZE)),
-                    ('a', (start_x, start_y)),
-                    ('s', (start_x + KEY_SIZE, start_y)),
-                    ('d', (start_x + 2 * KEY_SIZE, start_y))]
-            for key, (x, y) in keys:
-                color = KEY_COLOR_DOWN if act[key] else KEY_COLOR_UP
-                cv2.rectangle(frame, (x, y), (x + KEY_SIZE, y + KEY_SIZE), color, -1)
-                cv2.putText(frame, key.upper(), (x + 10, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-            dot_x = start_x + 3 * KEY_SIZE + 20
-            fire_y = start_y
-            scope_y = start_y - 2 * DOT_SIZE
-
-            # 开火圆点
-            fire_color = DOT_COLOR_DOWN if act['fire'] else DOT_COLOR_UP
-            cv2.circle(frame, (dot_x, fire_y), DOT_SIZE, fire_color, -1)
-            cv2.putText(frame, 'Fire', (dot_x - 20, fire_y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-            # 开镜圆点
-            scope_color = DOT_COLOR_DOWN if act['scope'] else DOT_COLOR_UP
-            cv2.circle(frame, (dot_x, scope_y), DOT_SIZE, scope_color, -1)
-            cv2.putText(frame, 'Scope', (dot_x - 20, scope_y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-
-            # 4, 5, 6, g
-            left_keys = ['4', '5', '6', 'g']
-            left_start_x = 10
-            left_start_y = start_y - 4 * KEY_SIZE
-            for i, key in enumerate(left_keys):
-                x = left_start_x
-                y = left_start_y + i * (KEY_SIZE + 0)  # 间隔
-                color = KEY_COLOR_DOWN if act[key] else KEY_COLOR_UP
-                cv2.rectangle(frame, (x, y), (x + KEY_SIZE, y + KEY_SIZE), color, -1)
-                cv2.putText(frame, key.upper(), (x + 10, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+            # cached sprite, redrawn only when a key changes
+            self.hud.render(frame, act)
 
         if deep_frame is None:
             return frame
 
-        if len(deep_frame.shape) == 2:
-            # 归一化到 [0, 255]
-            depth_min = deep_frame.min()
-            depth_max = deep_frame.max()
-            if depth_max > depth_min:
-                deep_frame = 255 * (deep_frame - depth_min) / (depth_max - depth_min)
-            deep_frame = np.uint8(deep_frame)
-            # deep_frame = cv2.cvtColor(deep_frame, cv2.COLOR_GRAY2BGR)
-            deep_frame = cv2.applyColorMap(deep_frame, cv2.COLORMAP_INFERNO)
-
-        # 获取两个图像的高度和宽度
-        frame_height, frame_width = frame.shape[:2]
-        deep_frame_height, deep_frame_width = deep_frame.shape[:2]
-
-        # 确保两个图像高度一致
-        if frame_height > deep_frame_height:
-            deep_frame = self.embed_image_in_black_bg(deep_frame, frame_height)
-        else:
-            frame = self.embed_image_in_black_bg(frame, deep_frame_height)
-
-        # 左右拼接两个图像
-        combined_frame = np.hstack((frame, deep_frame))
-
-        MAX_WIDTH = 1200
-        if combined_frame.shape[1] > MAX_WIDTH:
-            combined_frame = resize_image_to_width(combined_frame, MAX_WIDTH)
-        return combined_frame
-
-    def embed_image_in_black_bg(self, small_img, target_height):
-        """
-        将小图像嵌入到黑色背景中，使其高度与目标高度一致
-        :param small_img: 小图像
-        :param target_height: 目标高度
-        :return: 嵌入后的图像
-        """
-        small_height, small_width = small_img.shape[:2]
-        # 创建一个黑色背景
-        black_bg = np.zeros((target_height, small_width, 3), dtype=np.uint8)
-        # 计算嵌入位置
-        start_y = (target_height - small_height) // 2
-
-        # 检查小图像是否为单通道
-        if len(small_img.shape) == 2:
-            # 将单通道图像转换为三通道图像
-            small_img = cv2.cvtColor(small_img, cv2.COLOR_GRAY2BGR)
-
-        # 将小图像嵌入到黑色背景中
-        black_bg[start_y:start_y + small_height, :] = small_img
-        return black_bg
\ No newline at end of file
+        # frame | depth side by side, the depth side only changes with a new deep_frame
+        return self.depth_panel.compose(frame, deep_frame)
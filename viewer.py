@@ -0,0 +1,78 @@
+import time
+import argparse
+
+from siri.global_config import GlobalConfig as cfg
+from siri.utils.logger import lprint
+from siri.utils.img_window import FrameDisplay
+from siri.utils.shm_ring import ShmFrameReader
+from siri.utils.pipeline import StageStats
+
+
+def attach(name, stop_at=None):
+    """waits for the Visualizer (cfg.plt = 'shm') to create the ring"""
+    while True:
+        try:
+            return ShmFrameReader(name)
+        except FileNotFoundError:
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return None
+            time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="shows / records the annotated frames a Visualizer publishes with cfg.plt = 'shm', in its own process")
+    parser.add_argument('--name', default=cfg.shm_name, help="shared memory ring name, cfg.shm_name")
+    parser.add_argument('--plt', default='qt', choices=('qt', 'cv2', 'plt', 'none'))
+    parser.add_argument('--record', default=None, help="also record to this video file (cfg.record_* settings)")
+    parser.add_argument('--fps', type=float, default=1/cfg.tick, help="fps of the recording")
+    parser.add_argument('--reattach', type=float, default=2., help="seconds without frames before looking for a new session")
+    parser.add_argument('--exit-after', type=float, default=None, help="exit after this many seconds without a session")
+    args = parser.parse_args()
+
+    display = FrameDisplay(args.plt, f"Visualizer [{args.name}]")
+    recorder = None
+    if args.record is not None:
+        from siri.vision.recorder import VideoRecorder
+        recorder = VideoRecorder(args.record, args.fps)
+    stats = StageStats('viewer')
+    t_report = time.monotonic()
+
+    reader = None
+    seq = -1
+    try:
+        while True:
+            if reader is None:
+                stop_at = None if args.exit_after is None else time.monotonic() + args.exit_after
+                reader = attach(args.name, stop_at)
+                if reader is None:
+                    break
+                lprint('viewer', f"attached to {args.name}")
+                seq = -1
+            res = reader.wait(after=seq, timeout=args.reattach)
+            if res is None:
+                # the session may have ended or restarted with a new ring
+                reader.close()
+                reader = None
+                continue
+            seq, frame, meta = res
+            t0 = time.monotonic()
+            display.show(frame)
+            if recorder is not None:
+                recorder.submit(frame)
+            t1 = time.monotonic()
+            stats.record(t1 - t0, age=t1 - meta['t_write'])
+            if t1 - t_report > cfg.stage_report_interval > 0:
+                lprint('viewer', f"{stats.summary()} torn={reader.n_torn}")
+                t_report = t1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if reader is not None:
+            reader.close()
+        if recorder is not None:
+            recorder.stop()
+        display.close()
+
+
+if __name__ == '__main__':
+    main()
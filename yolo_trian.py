@@ -3,6 +3,7 @@ import cv2
 from ultralytics import YOLO
 from siri.vision.detector import Detector
 from siri.global_config import GlobalConfig as cfg
+from siri.utils.device import device_policy
 
 
 def train(model, dataset_yaml):
@@ -11,7 +12,7 @@ def train(model, dataset_yaml):
         data=dataset_yaml,  # path to dataset YAML
         epochs=100,  # number of training epochs
         imgsz=640,  # training image size
-        device=cfg.device,
+        device=str(device_policy.device),
 
         # hsv_h=0.2,
         # hsv_s=0.2